@@ -1 +1 @@
-from . import areas, paths, fields, heuristics
\ No newline at end of file
+from . import areas, paths, field_models, fields, heuristics, trajectories, coverage, planners
\ No newline at end of file
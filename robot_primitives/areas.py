@@ -1,3 +1,4 @@
+import shapely
 import shapely.geometry
 import shapely.ops
 import numpy as np
@@ -6,7 +7,111 @@ import operator
 import os
 import json
 
-from .base import Area, AreaType
+from .base import Area, AreaType, _ragged_arange
+
+def _cross(u, v):
+	return u[:,0]*v[:,1] - u[:,1]*v[:,0]
+
+def _unit(u):
+	norm = np.linalg.norm(u, axis=1)
+	return u / np.where(norm > 0., norm, 1.)[:,np.newaxis]
+
+def _points_into_corner(directions, to_next, to_prev):
+	""" Test whether unit directions point strictly into the interior angle at
+		 a vertex of a ccw polygon, given unit vectors to the next and previous vertices
+	"""
+	eps = 1e-9
+	corner = _cross(to_next, to_prev)
+	into_convex = (_cross(to_next, directions) > eps) & (_cross(directions, to_prev) > eps)
+	into_reflex = ~((_cross(to_prev, directions) >= -eps) & (_cross(directions, to_next) >= -eps))
+	into_straight = _cross(to_next, directions) > eps
+
+	return np.where(corner > eps, into_convex, np.where(corner < -eps, into_reflex, into_straight))
+
+def _segments_enter_interior(a, b, v, w, p, tol):
+	""" Test whether each segment a->b enters the interior of a ccw polygon at its edge v->w,
+		 either by properly crossing the edge, by passing through vertex v (whose preceding
+		 vertex is p) into the interior angle or by leaving the edge towards the interior
+		 from an endpoint lying on it
+	"""
+	d = b - a
+	e = w - v
+	d_len = np.linalg.norm(d, axis=1)
+	e_len = np.linalg.norm(e, axis=1)
+	valid = (d_len > tol) & (e_len > tol)
+	d_len = np.where(valid, d_len, 1.)
+	e_len = np.where(valid, e_len, 1.)
+
+	# Signed distances of edge endpoints from segment line and segment endpoints from edge line
+	v_side = _cross(d, v - a) / d_len
+	w_side = _cross(d, w - a) / d_len
+	a_side = _cross(e, a - v) / e_len
+	b_side = _cross(e, b - v) / e_len
+
+	opposite = lambda s1, s2: ((s1 > tol) & (s2 < -tol)) | ((s1 < -tol) & (s2 > tol))
+	entered = opposite(v_side, w_side) & opposite(a_side, b_side)
+
+	# Segment touches vertex v, check whether it continues into the polygon on either side of v
+	d_unit = d / d_len[:,np.newaxis]
+	to_next = _unit(e)
+	to_prev = _unit(p - v)
+	v_proj = np.sum((v - a) * d_unit, axis=1)
+	touches_v = (np.abs(v_side) <= tol) & (v_proj >= -tol) & (v_proj <= d_len + tol)
+	entered |= touches_v & (v_proj < d_len - tol) & _points_into_corner(d_unit, to_next, to_prev)
+	entered |= touches_v & (v_proj > tol) & _points_into_corner(-d_unit, to_next, to_prev)
+
+	# Segment endpoint lies in the open edge and the segment leaves it on the interior (left) side
+	a_proj = np.sum((a - v) * to_next, axis=1)
+	b_proj = np.sum((b - v) * to_next, axis=1)
+	into_left = _cross(to_next, d_unit)
+	entered |= (np.abs(a_side) <= tol) & (a_proj > tol) & (a_proj < e_len - tol) & (into_left > 1e-9)
+	entered |= (np.abs(b_side) <= tol) & (b_proj > tol) & (b_proj < e_len - tol) & (into_left < -1e-9)
+
+	return entered & valid
+
+def _node_pairs(num_nodes, chunk_size):
+	""" Yield all index pairs i < j in blocks of rows holding roughly chunk_size pairs """
+	row = 0
+	while row < num_nodes - 1:
+		row_counts = num_nodes - 1 - np.arange(row, num_nodes - 1)
+		num_rows = max(int(np.searchsorted(np.cumsum(row_counts), chunk_size, side='right')), 1)
+		rows = np.arange(row, row + num_rows)
+		counts = row_counts[:num_rows]
+
+		src = np.repeat(rows, counts)
+		dst = _ragged_arange(counts, rows + 1)
+		yield src, dst
+
+		row += num_rows
+
+def _convex_diameter(hull):
+	""" Diameter of a convex polygon by rotating calipers
+
+		 The farthest pair of vertices is antipodal, and every antipodal pair is an
+		 endpoint of some edge with the vertex extreme in the direction opposite the
+		 edge normal. Those vertices are found for all edges at once by searching the
+		 sorted edge normal angles
+	"""
+	if len(hull) < 3:
+		return float(np.linalg.norm(hull.max(axis=0) - hull.min(axis=0))) if len(hull) else 0.
+
+	if np.sum(_cross(hull, np.roll(hull, -1, axis=0))) < 0.:
+		hull = hull[::-1]
+
+	# Outward normal angles of the ccw edges, unwrapped to increase from the first
+	edges = np.roll(hull, -1, axis=0) - hull
+	normal_angles = np.arctan2(-edges[:,0], edges[:,1])
+	normal_angles = normal_angles[0] + np.concatenate(([0.], np.cumsum(np.mod(np.diff(normal_angles), 2*np.pi))))
+
+	# Vertex j is extreme for directions between the normals of edges j-1 and j
+	opposite = normal_angles[0] + np.mod(normal_angles + np.pi - normal_angles[0], 2*np.pi)
+	antipodes = np.searchsorted(normal_angles, opposite) % len(hull)
+
+	edge_ends = np.arange(len(hull))[:,np.newaxis] + np.array([0, 0, 1, 1])
+	candidates = antipodes[:,np.newaxis] + np.array([0, 1, 0, 1])
+	pairs = hull[edge_ends % len(hull)] - hull[candidates % len(hull)]
+
+	return float(np.sqrt(np.max(np.sum(pairs**2, axis=2))))
 
 class AreaJSONEncoder(json.JSONEncoder):
 
@@ -31,20 +136,67 @@ class Region(Area):
 		self._type = area_type
 		self._id = identifier
 		self._vertices = list(self._polygon.exterior.coords)[:-1]
+		self._init_geometry()
+
+	def _init_geometry(self):
+		""" Cache the exterior ring as an array, edge geometry and diameter are derived from it on first use """
+		self._ring_array = shapely.get_coordinates(self._polygon.exterior)
+		self._vertex_array = self._ring_array[:-1]
+		self._edge_geometry = None
+		self._diameter = None
+
+	def _get_edge_geometry(self):
+		""" Edge vectors, lengths, outward unit normals and interior angles of the exterior, computed once """
+		if self._edge_geometry is None:
+			vertices = self._vertex_array
+			edges = np.roll(vertices, -1, axis=0) - vertices
+			lengths = np.linalg.norm(edges, axis=1)
+
+			# Outward normals lie to the right of edges on a ccw ring and to the left on a cw one
+			normals = _unit(np.column_stack((edges[:,1], -edges[:,0])))
+			if not self._polygon.exterior.is_ccw:
+				normals = -normals
+
+			# Angle between the edges to the previous and next vertices
+			to_prev = -np.roll(edges, 1, axis=0)
+			angles = np.degrees(np.arctan2(np.abs(_cross(to_prev, edges)), np.sum(to_prev * edges, axis=1)))
+
+			self._edge_geometry = (edges, lengths, normals, angles)
+
+		return self._edge_geometry
 
 	def get_side(self, side_index):
 		if side_index >= self.num_sides:
 			raise IndexError(f"Error: Requested side index {side_index} > number of defined sides {self.num_sides}.")
-		
-		return self._polygon.exterior.coords[side_index:side_index+2] 
+
+		# Indices past the exterior ring, counted for obstacle vertices of a Domain, give a truncated slice as they always have
+		return [tuple(pt) for pt in self._ring_array[side_index:side_index+2].tolist()]
+
+	def _get_prepared_polygon(self):
+		""" Lazily prepare polygon in place so repeated predicates reuse its spatial index """
+		if not shapely.is_prepared(self._polygon):
+			shapely.prepare(self._polygon)
+
+		return self._polygon
 
 	def contains_point(self, point):
-		return self._polygon.intersects(shapely.geometry.Point(*point))
+		x, y = point[0], point[1]
+		return bool(shapely.intersects_xy(self._get_prepared_polygon(), x, y))
+
+	def contains_points(self, points):
+		""" Vectorized contains_point, returns boolean mask over (N,2) array of points """
+		points = np.asarray(points, dtype=float).reshape(-1, 2)
+		return shapely.intersects_xy(self._get_prepared_polygon(), points[:,0], points[:,1])
 
 	@property
 	def vertices(self):
 		return self._vertices
 
+	@property
+	def vertex_array(self):
+		""" (N,2) array of the exterior vertices, without the repeated closing point """
+		return self._vertex_array
+
 	@property
 	def num_sides(self):
 		return len(self._vertices)
@@ -52,23 +204,22 @@ class Region(Area):
 	@property
 	def interior_angles(self):
 		""" Return interior angles of polygon that defines the area """
-		coord_list = list(self._polygon.exterior.coords)[:-1]
-
-		interior_angles = {}
-
-		for i, pt in enumerate(coord_list):
-			curr_pt = np.array(pt)
-			prev_pt = np.array(coord_list[i-1])
-			next_pt = np.array(coord_list[(i+1)%len(coord_list)])
+		angles = self._get_edge_geometry()[3]
+		return dict(zip(map(tuple, self._vertex_array.tolist()), angles.tolist()))
 
-			a = prev_pt - curr_pt
-			b = next_pt - curr_pt
-			cos_angle = np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-			angle = np.degrees(np.arccos(cos_angle))
+	@property
+	def edge_vectors(self):
+		""" (N,2) array of vectors from each exterior vertex to the next """
+		return self._get_edge_geometry()[0]
 
-			interior_angles[pt] = angle
+	@property
+	def edge_lengths(self):
+		return self._get_edge_geometry()[1]
 
-		return interior_angles
+	@property
+	def edge_normals(self):
+		""" (N,2) array of outward unit normals of the exterior edges """
+		return self._get_edge_geometry()[2]
 
 	@property
 	def bounds(self):
@@ -80,9 +231,16 @@ class Region(Area):
 
 	@property
 	def diameter(self):
-		# returns maximum diameter of polygon?
-		min_x, min_y, max_x, max_y = self.bounds
-		return np.linalg.norm((max_x-min_x, max_y-min_y))
+		""" Greatest distance between two points of the polygon """
+		if self._diameter is None:
+			# Hulls of degenerate polygons are lines or points, only polygon rings repeat their first vertex
+			hull = shapely.convex_hull(self._polygon)
+			hull_vertices = shapely.get_coordinates(hull)
+			if isinstance(hull, shapely.Polygon):
+				hull_vertices = hull_vertices[:-1]
+			self._diameter = _convex_diameter(hull_vertices)
+
+		return self._diameter
 
 class Domain(Region):
 	""" Domain represents the entire area over which planning occurs. 
@@ -96,8 +254,11 @@ class Domain(Region):
 		self._type = AreaType.FREE
 		self._polygon = bounding_polygon
 		self._vertices = list(self._polygon.exterior.coords)[:-1] # Dropping the last repeated point, needs testing, may break stuff
+		self._init_geometry()
 
 		self._obstacles = {}
+		self._version = 0
+		self._invalidate_caches()
 
 		self._ingress_point = ingress_point
 		self._egress_point = egress_point
@@ -131,37 +292,111 @@ class Domain(Region):
 	@classmethod
 	def from_file(cls, filename):
 		extension = os.path.splitext(filename)[1][1:]
+		if extension == 'npz':
+			return cls.from_npz(filename)
+
 		with open(filename, mode='r') as f:
 			if extension == 'json':
 				domain = json.load(f, object_hook=Domain.from_json_dict)
 			else:
-				print(f"Error: Unrecognized extension {extension}, supported extension is json")
+				print(f"Error: Unrecognized extension {extension}, supported extensions are json and npz")
 				domain = None
 
 		return domain
 
+	@classmethod
+	def from_npz(cls, filename):
+		with np.load(filename) as data:
+			point = lambda key: tuple(data[key].tolist()) if data[key].size else None
+			domain = cls(shapely.geometry.Polygon(data['boundary']), ingress_point=point('ingress'), egress_point=point('egress'))
+
+			obstacle_vertices = np.split(data['obstacle_vertices'], np.cumsum(data['obstacle_sizes'])[:-1])
+			if len(data['obstacle_sizes']) > 0:
+				domain.add_obstacles(*[Obstacle(shapely.geometry.Polygon(v)) for v in obstacle_vertices])
+
+		return domain
+
 	def json_repr(self):
 		return dict(id=self._id, vertices=self._vertices, ingress=self._ingress_point, egress=self._egress_point)
 
 	def save(self, filename):
 		extension = os.path.splitext(filename)[1][1:]
+		if extension == 'npz':
+			self.save_npz(filename)
+			return
+
 		with open(filename, 'w') as f:
 			if extension == 'json':
 				json.dump(self, f, skipkeys=True, cls=Domain.json_encoder, indent=2)
 			else:
-				print(f"Error: Unrecognized extension {extension}, supported extension is json")
+				print(f"Error: Unrecognized extension {extension}, supported extensions are json and npz")
+
+	def save_npz(self, filename):
+		""" Save boundary and obstacle vertices as raw arrays in an uncompressed npz archive """
+		obstacle_vertices = [np.asarray(o.vertices, dtype=float).reshape(-1, 2) for o in self._obstacles.values()]
+		point = lambda p: np.asarray(p if p is not None else [], dtype=float)
+
+		np.savez(filename, boundary=np.asarray(self._polygon.exterior.coords)[:-1],
+			obstacle_vertices=np.concatenate(obstacle_vertices) if obstacle_vertices else np.empty((0, 2)),
+			obstacle_sizes=np.array([len(v) for v in obstacle_vertices], dtype=np.int64),
+			ingress=point(self._ingress_point), egress=point(self._egress_point))
 
 	def add_obstacle(self, obstacle):
 		self._obstacles[obstacle.id] = obstacle
 		self._vertices.extend(obstacle.vertices)
+		self._invalidate_caches()
 
 	def add_obstacles(self, *obstacles):
 		for o in obstacles:
 			self._obstacles[o.id] = o
 			self._vertices.extend(o.vertices)
+		self._invalidate_caches()
+
+	def _invalidate_caches(self):
+		""" Drop geometry derived from obstacles and bump version so downstream caches can tell """
+		self._version += 1
+		self._composite_polygon = None
+		self._obstacle_index = None
+		self._edge_index = None
+		self._visibility_graphs = {}
+		self._grid_graphs = {}
+		self._rasters = {}
+
+	def _get_obstacle_index(self):
+		""" Lazily build spatial index over obstacle polygons, rebuilt after obstacles change """
+		if self._obstacle_index is None:
+			obstacles = list(self._obstacles.values())
+			self._obstacle_index = (shapely.STRtree([o.polygon for o in obstacles]), obstacles)
+
+		return self._obstacle_index
+
+	def _get_edge_index(self):
+		""" Lazily build spatial index over obstacle edges along with a table of
+			 edge start, end and preceding vertices with every obstacle oriented ccw
+		"""
+		if self._edge_index is None:
+			rings = []
+			for o in self._obstacles.values():
+				ring = np.asarray(o.polygon.exterior.coords)[:-1]
+				rings.append(ring if o.polygon.exterior.is_ccw else ring[::-1])
+
+			starts = np.concatenate(rings)
+			ends = np.concatenate([np.roll(r, -1, axis=0) for r in rings])
+			prevs = np.concatenate([np.roll(r, 1, axis=0) for r in rings])
+			tree = shapely.STRtree(shapely.linestrings(np.stack((starts, ends), axis=1)))
+
+			self._edge_index = (tree, starts, ends, prevs)
+
+		return self._edge_index
+
+	def query_obstacles(self, obj, predicate='intersects'):
+		""" Return obstacles whose polygons satisfy predicate against obj, using the spatial index """
+		tree, obstacles = self._get_obstacle_index()
+
+		return [obstacles[i] for i in tree.query(obj, predicate=predicate)]
 
 	def compute_intersection(self, obj):
-		if not self._polygon.intersects(obj):
+		if not self._get_prepared_polygon().intersects(obj):
 			return []
 
 		intersection  = self._polygon.intersection(obj)
@@ -199,23 +434,226 @@ class Domain(Region):
 
 		# return intersection_points
 
+	def compute_intersections(self, objs):
+		""" Vectorized compute_intersection over an array of geometries
+
+			Returns (N,2,2) array holding the first two intersection coords
+			of each geometry with the domain boundary, nan where a geometry
+			does not cross the domain
+		"""
+		intersections = shapely.intersection(self._polygon, objs)
+		coords, index = shapely.get_coordinates(intersections, return_index=True)
+
+		counts = np.bincount(index, minlength=len(intersections))
+		starts = np.cumsum(counts) - counts
+		valid = counts >= 2
+
+		cross_sections = np.full((len(intersections), 2, 2), np.nan)
+		cross_sections[valid, 0] = coords[starts[valid]]
+		cross_sections[valid, 1] = coords[starts[valid] + 1]
+
+		return cross_sections
+
 	def get_configuration_space(self, vehicle_radius):
 		offset_boundary = self._polygon.buffer(-vehicle_radius, join_style=2)
 		offset_obstacles = [o.polygon.buffer(vehicle_radius, join_style=1) for o in self._obstacles.values()]
 
 		return (offset_boundary, offset_obstacles)
 
-	def line_of_sight(self, p1, p2):
+	def line_of_sight(self, p1, p2, resolution=None):
+		""" Whether the segment p1-p2 stays in free space. With a resolution the test uses the
+			 raster of the domain at that resolution and is conservative, see DomainRaster
+		"""
+		if resolution is not None:
+			return self.rasterize(resolution).line_of_sight(p1, p2)
+
 		line = shapely.geometry.LineString([p1, p2])
 
-		if not self._polygon.contains(line):
+		if not self._get_prepared_polygon().contains(line):
 			return False
 
-		for o in self._obstacles.values():
-			if line.intersects(o.polygon):
-				return False
-
-		return True
+		tree, _ = self._get_obstacle_index()
+
+		return len(tree.query(line, predicate='intersects')) == 0
+
+	def line_of_sight_many(self, pairs, resolution=None):
+		""" Vectorized line_of_sight over an (M,2,2) array of point pairs, returns bool array """
+		if resolution is not None:
+			return self.rasterize(resolution).line_of_sight_many(pairs)
+
+		pairs = np.asarray(pairs, dtype=float).reshape(-1, 2, 2)
+		lines = shapely.linestrings(pairs)
+
+		visible = shapely.contains(self._get_prepared_polygon(), lines)
+
+		if self._obstacles:
+			tree, _ = self._get_obstacle_index()
+			blocked, _ = tree.query(lines, predicate='intersects')
+			visible[blocked] = False
+
+		return visible
+
+	def _segments_clear(self, segments):
+		""" Test (M,2,2) array of segments for visibility graph edges, segments may
+			 run along the boundary or obstacle edges and touch obstacle vertices
+			 but may not pass through the interior of an obstacle
+		"""
+		lines = shapely.linestrings(segments)
+		clear = shapely.covers(self._get_prepared_polygon(), lines)
+
+		if not self._obstacles:
+			return clear
+
+		# Segments leaving a point strictly inside an obstacle are always blocked
+		obstacle_tree, _ = self._get_obstacle_index()
+		for endpoint in (segments[:,0], segments[:,1]):
+			inside, _ = obstacle_tree.query(shapely.points(endpoint), predicate='within')
+			clear[inside] = False
+
+		edge_tree, starts, ends, prevs = self._get_edge_index()
+		min_x, min_y, max_x, max_y = self._polygon.bounds
+		tol = 1e-9 * max(1., max_x - min_x, max_y - min_y)
+
+		# Walk each segment from its start in short pieces, testing the full segment
+		# against edges near the current piece only. Pieces have tight bounding boxes
+		# and segments blocked near their start are dropped from later rounds
+		lengths = np.linalg.norm(segments[:,1] - segments[:,0], axis=1)
+		piece_length = max(max_x - min_x, max_y - min_y) / 64.
+		num_pieces = np.maximum(np.ceil(lengths / piece_length).astype(np.intp), 1)
+
+		for k in range(num_pieces.max(initial=0)):
+			active = np.flatnonzero(clear & (num_pieces > k))
+			if len(active) == 0:
+				break
+
+			a, b = segments[active,0], segments[active,1]
+			piece_start = a + (b - a) * (k / num_pieces[active])[:,np.newaxis]
+			piece_end = a + (b - a) * np.minimum((k + 1) / num_pieces[active], 1.)[:,np.newaxis]
+
+			piece_idx, edge_idx = edge_tree.query(shapely.linestrings(np.stack((piece_start, piece_end), axis=1)))
+			seg_idx = active[piece_idx]
+
+			blocked = _segments_enter_interior(segments[seg_idx,0], segments[seg_idx,1], starts[edge_idx], ends[edge_idx], prevs[edge_idx], tol)
+			clear[seg_idx[blocked]] = False
+
+		return clear
+
+	def visibility_graph(self, vehicle_radius=None, tangent_only=False, chunk_size=2**16):
+		""" Build visibility graph over domain and obstacle vertices plus ingress and egress points
+
+			When vehicle_radius is given, the graph is built over the configuration
+			space returned by offset_domain. Candidate edges are generated and tested
+			in chunks against the obstacle edge index. With tangent_only, edges that
+			are not tangent to the obstacles at their endpoints are skipped, which
+			keeps every shortest path while shrinking graphs over rounded obstacles.
+			The result is cached until obstacles change
+		"""
+		key = (vehicle_radius, tangent_only)
+		if key in self._visibility_graphs:
+			return self._visibility_graphs[key]
+
+		domain = self if vehicle_radius is None else self.offset_domain(vehicle_radius)
+
+		# Track neighbouring vertices of obstacle vertices for the tangency test,
+		# other nodes are their own neighbours so they never fail it
+		rings = [np.asarray(domain._polygon.exterior.coords)[:-1]]
+		prevs = [rings[0]]
+		nexts = [rings[0]]
+		for o in domain.obstacles.values():
+			ring = np.asarray(o.vertices, dtype=float)
+			rings.append(ring)
+			prevs.append(np.roll(ring, 1, axis=0))
+			nexts.append(np.roll(ring, -1, axis=0))
+
+		# Ingress and egress points often sit on a boundary vertex or on each other, and
+		# become nodes only when they do not, to avoid zero length duplicate edges
+		extra = np.array([p for p in (self._ingress_point, self._egress_point) if p is not None], dtype=float).reshape(-1, 2)
+		extra = np.unique(extra, axis=0)
+		vertices = np.concatenate(rings)
+		extra = extra[~np.any(np.all(extra[:,np.newaxis] == vertices, axis=2), axis=1)]
+		nodes = np.concatenate(rings + [extra])
+		prevs = np.concatenate(prevs + [extra])
+		nexts = np.concatenate(nexts + [extra])
+
+		edges = []
+		for src, dst in _node_pairs(len(nodes), chunk_size):
+			if tangent_only:
+				d = nodes[dst] - nodes[src]
+				tangent = np.ones(len(src), dtype=bool)
+				for end in (src, dst):
+					tangent &= _cross(d, prevs[end] - nodes[end]) * _cross(d, nexts[end] - nodes[end]) >= 0.
+				src, dst = src[tangent], dst[tangent]
+
+			visible = domain._segments_clear(np.stack((nodes[src], nodes[dst]), axis=1))
+			edges.append(np.column_stack((src[visible], dst[visible])))
+
+		graph = Roadmap.from_edges(nodes, np.concatenate(edges) if edges else np.empty((0, 2)))
+		self._visibility_graphs[key] = graph
+
+		return graph
+
+	def grid_graph(self, resolution, vehicle_radius=None, diagonal=True):
+		""" Build grid graph over free space with nodes spaced by resolution
+
+			Nodes are grid points lying in free space, joined to their 4 neighbours,
+			or 8 with diagonal, wherever the segment between them stays in free
+			space. When vehicle_radius is given, the graph is built over the
+			configuration space returned by offset_domain. The result is cached
+			until obstacles change
+		"""
+		key = (resolution, vehicle_radius, diagonal)
+		if key in self._grid_graphs:
+			return self._grid_graphs[key]
+
+		domain = self if vehicle_radius is None else self.offset_domain(vehicle_radius)
+		free_space = domain.polygon
+
+		min_x, min_y, max_x, max_y = free_space.bounds
+		xs = np.arange(min_x, max_x + 0.5*resolution, resolution)
+		ys = np.arange(min_y, max_y + 0.5*resolution, resolution)
+		grid_x, grid_y = np.meshgrid(xs, ys)
+		inside = shapely.intersects_xy(free_space, grid_x, grid_y)
+
+		# Number free grid points, -1 elsewhere
+		node_ids = np.full(inside.shape, -1, dtype=np.intp)
+		node_ids[inside] = np.arange(inside.sum())
+		nodes = np.column_stack((grid_x[inside], grid_y[inside]))
+
+		# Padding with unused ids lets every offset be sliced out of the same array
+		padded = np.pad(node_ids, 1, constant_values=-1)
+		num_rows, num_cols = node_ids.shape
+
+		offsets = [(0, 1), (1, 0)] + ([(1, 1), (1, -1)] if diagonal else [])
+		edges = []
+		for dy, dx in offsets:
+			dst = padded[1+dy:num_rows+1+dy, 1+dx:num_cols+1+dx]
+			pairs = np.column_stack((node_ids.ravel(), dst.ravel()))
+			pairs = pairs[(pairs >= 0).all(axis=1)]
+			clear = shapely.covers(free_space, shapely.linestrings(np.stack((nodes[pairs[:,0]], nodes[pairs[:,1]]), axis=1)))
+			edges.append(pairs[clear])
+
+		graph = Roadmap.from_edges(nodes, np.concatenate(edges))
+		self._grid_graphs[key] = graph
+
+		return graph
+
+	def rasterize(self, resolution):
+		""" Occupancy bitmap and signed distance field of the domain sampled at cell centers
+			 spaced by resolution, cached until obstacles change
+		"""
+		if resolution not in self._rasters:
+			self._rasters[resolution] = DomainRaster.from_domain(self, resolution)
+
+		return self._rasters[resolution]
+
+	def visible_points(self, point, points):
+		""" Mask over an (N,2) array of points of those visible from point, using the
+			 same test as visibility_graph, so sight lines may graze obstacles
+		"""
+		points = np.asarray(points, dtype=float).reshape(-1, 2)
+		segments = np.stack((np.broadcast_to(np.asarray(point, dtype=float), points.shape), points), axis=1)
+
+		return self._segments_clear(segments)
 
 	def offset_domain(self, offset):
 		offset_boundary = self._polygon.buffer(-offset, join_style=2)
@@ -230,7 +668,17 @@ class Domain(Region):
 
 	@property
 	def polygon(self):
-		return shapely.geometry.Polygon(self._polygon.exterior.coords, holes=[o.polygon.exterior.coords for o in self._obstacles.values()])
+		""" Domain boundary with every obstacle as a hole, built once per obstacle change and prepared """
+		if self._composite_polygon is None:
+			self._composite_polygon = shapely.geometry.Polygon(self._polygon.exterior.coords, holes=[o.polygon.exterior.coords for o in self._obstacles.values()])
+			shapely.prepare(self._composite_polygon)
+
+		return self._composite_polygon
+
+	@property
+	def version(self):
+		""" Counter incremented whenever obstacles change, for keying caches derived from the domain """
+		return self._version
 	
 	@property
 	def obstacles(self):
@@ -245,6 +693,242 @@ class Domain(Region):
 		return self._egress_point
 	
 
+class Roadmap:
+	""" Graph over points in a domain stored as a compact CSR adjacency
+
+		 Outgoing edges of node i are indices[indptr[i]:indptr[i+1]] with
+		 lengths weights[indptr[i]:indptr[i+1]]
+	"""
+
+	def __init__(self, nodes, indptr, indices, weights):
+		self._nodes = nodes
+		self._indptr = indptr
+		self._indices = indices
+		self._weights = weights
+
+	@classmethod
+	def from_edges(cls, nodes, edges, weights=None, symmetric=True):
+		nodes = np.asarray(nodes, dtype=float).reshape(-1, 2)
+		edges = np.asarray(edges, dtype=np.intp).reshape(-1, 2)
+
+		if weights is None:
+			weights = np.linalg.norm(nodes[edges[:,1]] - nodes[edges[:,0]], axis=1)
+
+		if symmetric:
+			edges = np.vstack((edges, edges[:,::-1]))
+			weights = np.concatenate((weights, weights))
+
+		order = np.argsort(edges[:,0], kind='stable')
+		counts = np.bincount(edges[:,0], minlength=len(nodes))
+		indptr = np.concatenate(([0], np.cumsum(counts)))
+
+		return cls(nodes, indptr, edges[order,1], np.asarray(weights, dtype=float)[order])
+
+	def neighbors(self, node):
+		return self._indices[self._indptr[node]:self._indptr[node+1]]
+
+	def edge_weights(self, node):
+		return self._weights[self._indptr[node]:self._indptr[node+1]]
+
+	@property
+	def nodes(self):
+		return self._nodes
+
+	@property
+	def indptr(self):
+		return self._indptr
+
+	@property
+	def indices(self):
+		return self._indices
+
+	@property
+	def weights(self):
+		return self._weights
+
+	@property
+	def num_nodes(self):
+		return len(self._nodes)
+
+	@property
+	def num_edges(self):
+		return len(self._indices)
+
+
+def _edge_distance_grid(starts, ends, origin, resolution, shape, tile_size=32):
+	""" Distance from every cell center of a grid to the nearest of a set of segments
+
+		 The grid is split into square tiles and each tile is only compared against the
+		 segments that can be nearest to one of its cells, those within the distance of
+		 the nearest segment to the tile center plus twice the tile half diagonal
+	"""
+	rows, cols = shape
+	tile_rows, tile_cols = -(-rows // tile_size), -(-cols // tile_size)
+	tile_corners = np.stack(np.meshgrid(np.arange(tile_cols), np.arange(tile_rows)), axis=-1).reshape(-1, 2) * tile_size * resolution + origin
+	half_diagonal = tile_size * resolution * np.sqrt(0.5)
+
+	tree = shapely.STRtree(shapely.linestrings(np.stack((starts, ends), axis=1)))
+	tile_centers = shapely.points(tile_corners + tile_size * resolution / 2.)
+	_, nearest = tree.query_nearest(tile_centers, return_distance=True, all_matches=False)
+	tile, edge = tree.query(tile_centers, predicate='dwithin', distance=nearest + 2. * half_diagonal + resolution)
+
+	order = np.argsort(tile, kind='stable')
+	tile, edge = tile[order], edge[order]
+
+	offsets = resolution * (np.stack(np.meshgrid(np.arange(tile_size), np.arange(tile_size)), axis=-1).reshape(-1, 2) + 0.5)
+	tile_distance = np.empty((tile_rows * tile_cols, tile_size * tile_size))
+
+	# Tile and segment pairs in chunks to bound memory, each tile's pairs lying in one chunk
+	tile_starts = np.searchsorted(tile, np.arange(tile_rows * tile_cols + 1))
+	chunk_tiles = max(2**21 // (tile_size * tile_size * max(int(np.diff(tile_starts).max()), 1)), 1)
+	for first in range(0, tile_rows * tile_cols, chunk_tiles):
+		last = min(first + chunk_tiles, tile_rows * tile_cols)
+		pairs = slice(tile_starts[first], tile_starts[last])
+
+		a = starts[edge[pairs]][:,np.newaxis]
+		ab = ends[edge[pairs]][:,np.newaxis] - a
+		ap = tile_corners[tile[pairs]][:,np.newaxis] + offsets - a
+		t = np.clip((ap * ab).sum(axis=2) / np.maximum((ab * ab).sum(axis=2), 1e-300), 0., 1.)
+		squared = ((ap - t[...,np.newaxis] * ab)**2).sum(axis=2)
+
+		tile_distance[first:last] = np.minimum.reduceat(squared, tile_starts[first:last] - tile_starts[first], axis=0)
+
+	grid = tile_distance.reshape(tile_rows, tile_cols, tile_size, tile_size).transpose(0, 2, 1, 3)
+	return np.sqrt(grid.reshape(tile_rows * tile_size, tile_cols * tile_size)[:rows,:cols])
+
+
+class DomainRaster:
+	""" Raster of a domain for geometry free collision and clearance checks
+
+		 Holds an occupancy bitmap, packed 8 cells to a byte, and a float32 signed
+		 distance field over cell centers. Distances are to the nearest boundary or
+		 obstacle edge, positive in free space and negative elsewhere. Points off the
+		 raster are occupied with distance -inf
+	"""
+
+	def __init__(self, origin, resolution, occupancy_bits, distance, version=None):
+		self._origin = np.asarray(origin, dtype=float)
+		self._resolution = float(resolution)
+		self._occupancy_bits = occupancy_bits
+		self._distance = distance
+		self._version = version
+
+	@classmethod
+	def from_domain(cls, domain, resolution):
+		free_space = domain.polygon
+		min_x, min_y, max_x, max_y = free_space.bounds
+		num_cols = max(int(np.ceil((max_x - min_x) / resolution)), 1)
+		num_rows = max(int(np.ceil((max_y - min_y) / resolution)), 1)
+
+		centers_x, centers_y = np.meshgrid(min_x + resolution * (np.arange(num_cols) + 0.5), min_y + resolution * (np.arange(num_rows) + 0.5))
+		free = shapely.intersects_xy(free_space, centers_x, centers_y)
+
+		coords, ring_index = shapely.get_coordinates(shapely.get_rings(free_space), return_index=True)
+		same_ring = ring_index[1:] == ring_index[:-1]
+		distance = _edge_distance_grid(coords[:-1][same_ring], coords[1:][same_ring], (min_x, min_y), resolution, free.shape)
+
+		distance = np.where(free, distance, -distance).astype(np.float32)
+
+		return cls((min_x, min_y), resolution, np.packbits(~free, axis=1), distance, domain.version)
+
+	def _cell_index(self, points):
+		""" Row and column of the cell holding each point, and whether it lies on the raster """
+		cells = np.floor((points - self._origin) / self._resolution).astype(np.intp)
+		rows, cols = self._distance.shape
+		on_raster = (cells[:,0] >= 0) & (cells[:,0] < cols) & (cells[:,1] >= 0) & (cells[:,1] < rows)
+
+		return np.clip(cells[:,1], 0, rows - 1), np.clip(cells[:,0], 0, cols - 1), on_raster
+
+	def occupied(self, points):
+		""" Occupancy of the cell holding each of an (N,2) array of points """
+		points = np.asarray(points, dtype=float).reshape(-1, 2)
+		row, col, on_raster = self._cell_index(points)
+		bits = (self._occupancy_bits[row, col >> 3] >> (7 - (col & 7))) & 1
+
+		return (bits == 1) | ~on_raster
+
+	def distance(self, points):
+		""" Signed distance at an (N,2) array of points, bilinearly interpolated between cell centers """
+		points = np.asarray(points, dtype=float).reshape(-1, 2)
+		rows, cols = self._distance.shape
+
+		f = (points - self._origin) / self._resolution - 0.5
+		fx = np.clip(f[:,0], 0., max(cols - 1, 0))
+		fy = np.clip(f[:,1], 0., max(rows - 1, 0))
+		ix = np.minimum(np.floor(fx).astype(np.intp), max(cols - 2, 0))
+		iy = np.minimum(np.floor(fy).astype(np.intp), max(rows - 2, 0))
+		ix1 = np.minimum(ix + 1, cols - 1)
+		iy1 = np.minimum(iy + 1, rows - 1)
+		tx, ty = fx - ix, fy - iy
+
+		d = self._distance
+		bottom = (1. - tx) * d[iy, ix] + tx * d[iy, ix1]
+		top = (1. - tx) * d[iy1, ix] + tx * d[iy1, ix1]
+		distance = (1. - ty) * bottom + ty * top
+
+		_, _, on_raster = self._cell_index(points)
+		return np.where(on_raster, distance, -np.inf)
+
+	def clearance(self, points):
+		""" Lower bound on the signed distance at each point, from the center of its cell """
+		points = np.asarray(points, dtype=float).reshape(-1, 2)
+		row, col, on_raster = self._cell_index(points)
+
+		# Distance changes no faster than position, and a point is within half a cell diagonal of its center
+		clearance = self._distance[row, col] - self._resolution * np.sqrt(0.5)
+		return np.where(on_raster, clearance, -np.inf)
+
+	def line_of_sight(self, p1, p2):
+		return bool(self.line_of_sight_many(np.array([[p1, p2]], dtype=float))[0])
+
+	def line_of_sight_many(self, pairs):
+		""" Conservative line of sight over an (M,2,2) array of point pairs
+
+			 Segments are sampled every resolution and are clear only if every sample has
+			 clearance above half the sample spacing, so no point between samples can be
+			 blocked. Segments passing close to obstacles may be reported blocked
+		"""
+		pairs = np.asarray(pairs, dtype=float).reshape(-1, 2, 2)
+		lengths = np.linalg.norm(pairs[:,1] - pairs[:,0], axis=1)
+		num_samples = np.ceil(lengths / self._resolution).astype(np.intp) + 1
+
+		segment = np.repeat(np.arange(len(pairs)), num_samples)
+		k = _ragged_arange(num_samples)
+		t = k / np.maximum(num_samples[segment] - 1, 1)
+		samples = pairs[segment,0] + t[:,np.newaxis] * (pairs[segment,1] - pairs[segment,0])
+
+		spacing = lengths[segment] / np.maximum(num_samples[segment] - 1, 1)
+		clear = self.clearance(samples) > 0.5 * spacing
+
+		return np.bincount(segment, weights=~clear, minlength=len(pairs)) == 0
+
+	@property
+	def occupancy(self):
+		""" Unpacked (rows, cols) bool occupancy grid """
+		return np.unpackbits(self._occupancy_bits, axis=1, count=self._distance.shape[1]).astype(bool)
+
+	@property
+	def distance_field(self):
+		return self._distance
+
+	@property
+	def origin(self):
+		return self._origin
+
+	@property
+	def resolution(self):
+		return self._resolution
+
+	@property
+	def shape(self):
+		return self._distance.shape
+
+	@property
+	def version(self):
+		""" Version of the domain the raster was built from """
+		return self._version
+
+
 class Obstacle(Region):
 
 	id_num = 1
@@ -255,6 +939,7 @@ class Obstacle(Region):
 		self._type = AreaType.OBSTACLE
 		self._polygon = polygon
 		self._vertices = list(polygon.exterior.coords)[:-1] # Dropping last repeated point, needs testing
+		self._init_geometry()
 
 	@classmethod
 	def from_vertex_list(cls, vertices):
@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
 from enum import Enum
 
+import numpy as np
+
 class AreaType(Enum):
 	FREE = 0
 	OBSTACLE = 1
@@ -75,6 +77,22 @@ class Field(ABC):
 		"""
 		raise NotImplementedError()
 
+	def sample(self, points):
+		"""Method to sample field at many points at once
+
+		Subclasses should override this with a vectorized implementation,
+		the default falls back to sampling each point individually
+
+		Args:
+			points (ndarray): (N,2) array of points at which to sample the field
+
+		Returns:
+			values (ndarray): (N,2) array of values sampled from field
+
+		"""
+		points = np.asarray(points, dtype=float).reshape(-1, 2)
+		return np.array([self[tuple(pt)] for pt in points], dtype=float).reshape(-1, 2)
+
 
 	@property
 	def boundary(self):
@@ -86,4 +104,69 @@ class Heuristic(ABC):
 	@abstractmethod
 	def compute_cost(self, start_point, end_point):
 		""" Approximate the cost of movement between two points """
-		raise NotImplementedError()
\ No newline at end of file
+		raise NotImplementedError()
+
+	def compute_costs(self, start_points, end_points):
+		""" Approximate the cost of movement along many segments at once
+
+			Takes (N,2) arrays of start and end points and returns an (N,)
+			array of costs. Subclasses should override this with a vectorized
+			implementation, the default calls compute_cost for each segment
+		"""
+		start_points = np.asarray(start_points, dtype=float).reshape(-1, 2)
+		end_points = np.asarray(end_points, dtype=float).reshape(-1, 2)
+
+		return np.array([self.compute_cost(s, e) for s, e in zip(start_points, end_points)], dtype=float)
+
+	def path_cost(self, paths, **kwargs):
+		""" Cost of moving along one path or a list of paths
+
+			All segments of all paths are costed in a single compute_costs call.
+			For a single path returns the total cost and an (N-1,) array of
+			segment costs, for a list of paths returns a (P,) array of totals
+			and a list of per path segment cost arrays
+		"""
+		single = isinstance(paths, Path)
+		if single:
+			paths = [paths]
+
+		coords = [_path_coords(path) for path in paths]
+		num_segments = np.array([max(len(c) - 1, 0) for c in coords])
+		starts = np.concatenate([c[:-1] for c in coords] + [np.empty((0, 2))])
+		ends = np.concatenate([c[1:] for c in coords] + [np.empty((0, 2))])
+
+		costs = self.compute_costs(starts, ends, **kwargs) if len(starts) > 0 else np.zeros(0)
+		segment_costs = np.split(costs, np.cumsum(num_segments)[:-1])
+		totals = np.array([c.sum() for c in segment_costs])
+
+		if single:
+			return totals[0], segment_costs[0]
+
+		return totals, segment_costs
+
+
+def _path_coords(path):
+	coords = getattr(path, 'coords', None)
+	if coords is None:
+		coords = path.coord_list
+
+	return np.asarray(coords, dtype=float).reshape(-1, 2)
+def _ragged_arange(counts, offsets=0):
+	""" Concatenation of offsets[i] + arange(counts[i]) over all i, built without a Python loop """
+	counts = np.asarray(counts)
+	return np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts - offsets, counts)
+
+# Per process state of pool workers by task, set once when a worker starts
+_worker_states = {}
+
+def _init_worker(task, state):
+	""" Set the state dict of task in this process, as a pool initializer or before running
+		 task serially. A state of None clears it
+	"""
+	if state is None:
+		_worker_states.pop(task, None)
+	else:
+		_worker_states[task] = state
+
+def _worker_state(task):
+	return _worker_states[task]
@@ -0,0 +1,295 @@
+import numpy as np
+import shapely
+import collections
+import concurrent.futures
+
+from .areas import Domain, Obstacle
+from .base import _ragged_arange, _init_worker, _worker_state
+from .paths import ConstrainedPath
+from .heuristics import QuadratureFlowEnergy
+from .planners import GraphPlanner
+
+SweepResult = collections.namedtuple('SweepResult', ['direction', 'angle', 'cost', 'angles', 'costs'])
+
+def _rotation(sweep_direction):
+	""" Rotation matrix taking sweep_direction onto the x axis """
+	direction = np.asarray(sweep_direction, dtype=float)
+	c, s = direction / np.linalg.norm(direction)
+
+	return np.array([[c, s], [-s, c]])
+
+def _free_space(domain):
+	""" Domain polygon with obstacles as holes, rebuilt by difference when obstacles overlap """
+	polygon = domain.polygon
+	if shapely.is_valid(polygon):
+		return polygon
+
+	holes = shapely.union_all(shapely.polygons(list(polygon.interiors)))
+	return shapely.difference(shapely.Polygon(polygon.exterior), holes)
+
+def _sweep_segments(polygon, spacing):
+	""" Intersect every horizontal sweep line spaced by spacing with polygon at once
+
+		Crossings of each line with the polygon edges are found in bulk, using half open
+		edge spans so lines through vertices are counted once, and paired up along each
+		line into the segments lying inside the polygon.
+
+		Returns line heights and, per segment, its line index and start and end x
+	"""
+	min_x, min_y, max_x, max_y = polygon.bounds
+	num_lines = max(int(np.ceil((max_y - min_y) / spacing - 1e-9)), 1)
+	line_ys = min_y + (max_y - min_y - (num_lines - 1) * spacing) / 2 + spacing * np.arange(num_lines)
+
+	coords, ring_index = shapely.get_coordinates(shapely.get_rings(polygon), return_index=True)
+	same_ring = ring_index[1:] == ring_index[:-1]
+	starts, ends = coords[:-1][same_ring], coords[1:][same_ring]
+
+	low = np.minimum(starts[:,1], ends[:,1])
+	high = np.maximum(starts[:,1], ends[:,1])
+	first_line = np.searchsorted(line_ys, low, side='left')
+	counts = np.searchsorted(line_ys, high, side='left') - first_line
+
+	# One entry per crossing of an edge by a line
+	edge = np.repeat(np.arange(len(starts)), counts)
+	line = _ragged_arange(counts, first_line)
+	x0, y0 = starts[edge,0], starts[edge,1]
+	dx, dy = ends[edge,0] - x0, ends[edge,1] - y0
+	crossing_x = x0 + (line_ys[line] - y0) * dx / dy
+
+	order = np.lexsort((crossing_x, line))
+	line, crossing_x = line[order], crossing_x[order]
+
+	# Even-odd rule, each line has an even number of crossings
+	segment_line = line[0::2]
+	segment_start, segment_end = crossing_x[0::2], crossing_x[1::2]
+	nonempty = segment_end > segment_start
+
+	return line_ys, segment_line[nonempty], segment_start[nonempty], segment_end[nonempty]
+
+def _overlap_ranges(line, start, end, other_line):
+	""" For each segment, the range of segments on line other_line overlapping it in x,
+		 segments are sorted by line then x and do not overlap within a line
+	"""
+	# Offsetting x by line number keeps keys sorted across lines
+	width = max(end.max() - start.min(), 1.) * 2
+	origin = start.min()
+	start_keys = line * width + (start - origin)
+	end_keys = line * width + (end - origin)
+
+	line_starts = np.searchsorted(line, np.arange(line.max() + 2))
+	lo = np.searchsorted(end_keys, other_line * width + (start - origin), side='right')
+	hi = np.searchsorted(start_keys, other_line * width + (end - origin), side='left')
+
+	valid_line = (other_line >= 0) & (other_line <= line.max())
+	clipped_line = np.clip(other_line, 0, line.max())
+	lo = np.maximum(lo, line_starts[clipped_line])
+	hi = np.minimum(hi, line_starts[clipped_line + 1])
+
+	return lo, np.where(valid_line, np.maximum(hi, lo), lo)
+
+def decompose(domain, sweep_direction, spacing, offset=0.):
+	""" Boustrophedon decomposition of the free space of domain, optionally shrunk by offset
+
+		Sweep lines run along sweep_direction spaced by spacing. A segment of a sweep line
+		continues the cell of the segment before it when the two overlap only each other,
+		so new cells begin wherever obstacles or the boundary split or merge the sweep.
+
+		Returns segments as an (S,2,2) array of start and end points in the frame of
+		the domain, ordered by line and along each line, and the (S,) cell index of each
+	"""
+	if offset > 0.:
+		domain = domain.offset_domain(offset)
+
+	return _decompose_polygon(_free_space(domain), sweep_direction, spacing)
+
+def _decompose_polygon(free_space, sweep_direction, spacing):
+	rotation = _rotation(sweep_direction)
+	polygon = shapely.transform(free_space, lambda coords: coords @ rotation.T)
+	line_ys, line, start, end = _sweep_segments(polygon, spacing)
+
+	if len(line) == 0:
+		return np.zeros((0, 2, 2)), np.zeros(0, dtype=int)
+
+	# Overlaps with the previous and next lines
+	prev_lo, prev_hi = _overlap_ranges(line, start, end, line - 1)
+	next_lo, next_hi = _overlap_ranges(line, start, end, line + 1)
+
+	single_prev = prev_hi - prev_lo == 1
+	prev = np.where(single_prev, prev_lo, -1)
+	continues = single_prev & (next_hi - next_lo == 1)[np.clip(prev, 0, None)]
+
+	# Each segment has at most one predecessor, so cells are chains resolved by pointer jumping
+	root = np.where(continues, prev, np.arange(len(line)))
+	while True:
+		next_root = root[root]
+		if np.array_equal(next_root, root):
+			break
+		root = next_root
+
+	cells = np.unique(root, return_inverse=True)[1]
+
+	points = np.stack((np.column_stack((start, line_ys[line])), np.column_stack((end, line_ys[line]))), axis=1)
+	return points @ rotation, cells
+
+def boustrophedon_path(domain, sweep_direction, spacing, offset=0.):
+	""" Lawnmower coverage path over domain sweeping along sweep_direction
+
+		The free space is decomposed into cells with decompose and each cell is
+		covered by sweeping back and forth along its lines, cells being visited in
+		the order they are first met by the sweep. Turn-arounds and moves between
+		cells that would leave the free space follow the shortest route around the
+		cell boundary and obstacles instead. Returns a ConstrainedPath with the index
+		of the cell each point belongs to in a cell constraint, points on a route
+		taking the cell they lead to
+	"""
+	if offset > 0.:
+		domain = domain.offset_domain(offset)
+
+	free_space = _free_space(domain)
+
+	return _sweep_path(free_space, sweep_direction, spacing, _free_space_planner(free_space))
+
+def _free_space_planner(free_space):
+	""" Planner over the visibility graph of free_space, with its holes as obstacles,
+		 or None when free_space is not a single polygon
+	"""
+	if not isinstance(free_space, shapely.Polygon) or free_space.is_empty:
+		return None
+
+	domain = Domain(shapely.Polygon(free_space.exterior))
+	domain.add_obstacles(*[Obstacle(shapely.Polygon(ring)) for ring in free_space.interiors])
+
+	return GraphPlanner.from_domain(domain)
+
+def _sweep_path(free_space, sweep_direction, spacing, planner=None):
+	segments, cells = _decompose_polygon(free_space, sweep_direction, spacing)
+	if len(segments) == 0:
+		return ConstrainedPath([])
+
+	# Segments grouped by cell, in line order within each cell
+	order = np.argsort(cells, kind='stable')
+	segments, cells = segments[order], cells[order]
+
+	# Alternate sweep direction along each cell
+	first_in_cell = np.searchsorted(cells, cells)
+	reverse = (np.arange(len(cells)) - first_in_cell) % 2 == 1
+	segments[reverse] = segments[reverse][:,::-1]
+
+	points, point_cells = segments.reshape(-1, 2), np.repeat(cells, 2)
+	if planner is None or len(segments) < 2:
+		return ConstrainedPath(points, cell=point_cells)
+
+	# Moves join the end of each segment to the start of the next, those leaving the
+	# free space beyond rounding are replaced by planned routes
+	min_x, min_y, max_x, max_y = free_space.bounds
+	tol = 1e-9 * max(1., max_x - min_x, max_y - min_y)
+	moves = np.stack((segments[:-1,1], segments[1:,0]), axis=1)
+	blocked = np.flatnonzero(_leaves_free_space(free_space, moves, tol))
+
+	# Segment ends lie on the boundary up to rounding, so routes are planned from
+	# ends pulled slightly into their segments to keep them visible from the roadmap
+	directions = segments[:,1] - segments[:,0]
+	directions /= np.linalg.norm(directions, axis=1)[:,np.newaxis]
+	starts = segments[:-1,1] - tol * directions[:-1]
+	goals = segments[1:,0] + tol * directions[1:]
+
+	positions, detours = [], []
+	for k in blocked:
+		route = planner.plan(starts[k], goals[k])
+		if route is not None and route.size > 2:
+			detours.append(route.coords[1:-1])
+			positions.append(np.full(route.size - 2, 2*k + 2))
+
+	if not detours:
+		return ConstrainedPath(points, cell=point_cells)
+
+	positions = np.concatenate(positions)
+	points = np.insert(points, positions, np.concatenate(detours), axis=0)
+	point_cells = np.insert(point_cells, positions, point_cells[positions])
+
+	return ConstrainedPath(points, cell=point_cells)
+
+def _leaves_free_space(free_space, moves, tol):
+	""" Mask over an (M,2,2) array of moves of those passing further than tol outside
+		 free_space, which ignores rounding of the sweep segment ends
+	"""
+	return ~shapely.covers(shapely.buffer(free_space, tol, join_style='mitre'), shapely.linestrings(moves))
+
+def optimize_sweep_direction(domain, field, spacing, offset=0., heuristic=None, nominal_speed=0.5, resolution=None,
+										tolerance=1e-3, num_angles=36, refinements=3, workers=None):
+	""" Find the sweep direction whose boustrophedon path over domain takes the least energy in field
+
+		Sweep angles in [0, pi) are searched coarse to fine, num_angles evenly spaced angles
+		first and then refinements rounds of finer angles around the best so far. Each
+		candidate path is costed with heuristic.path_cost, in a process pool when workers > 1.
+		Without a heuristic a QuadratureFlowEnergy with the given tolerance is used, over
+		field rasterized once at resolution (spacing/2 by default) when field can be
+		rasterized, and shared by all candidates. Interpolating the raster already costs more
+		accuracy than a loose tolerance, which saves refining the quadrature around every
+		grid cell edge, and quadrature panels stop shrinking at an eighth of the resolution
+		so passes along the domain boundary stay cheap. The heuristic must be picklable to
+		be sent to the pool.
+
+		Returns a SweepResult with the best direction, its angle and cost, and the costs
+		at every angle evaluated, sorted by angle
+	"""
+	if offset > 0.:
+		domain = domain.offset_domain(offset)
+
+	if heuristic is None:
+		if resolution is None:
+			resolution = spacing / 2.
+		if hasattr(field, 'rasterize'):
+			field = field.rasterize(resolution)
+
+		# Passes run along the domain edges, where refinement would chase the boundary below the raster scale
+		heuristic = QuadratureFlowEnergy(field, nominal_speed, tolerance=tolerance, min_width=resolution / 8.)
+
+	free_space = _free_space(domain)
+	results = {}
+
+	def evaluate(angles, pool):
+		angles = [a for a in np.mod(angles, np.pi) if a not in results]
+		if pool is None:
+			costs = map(_sweep_cost, angles)
+		else:
+			costs = pool.map(_sweep_cost, angles)
+		results.update(zip(angles, costs))
+
+	pool = None
+	state = dict(free_space=free_space, spacing=spacing, heuristic=heuristic)
+	_init_worker('sweep', state)
+	if workers is not None and workers > 1:
+		pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=('sweep', state))
+
+	try:
+		step = np.pi / num_angles
+		evaluate(step * np.arange(num_angles), pool)
+
+		for _ in range(refinements):
+			best = min(results, key=results.get)
+			step /= 4.
+			evaluate(best + step * np.array([-3, -2, -1, 1, 2, 3]), pool)
+	finally:
+		if pool is not None:
+			pool.shutdown()
+		_init_worker('sweep', None)
+
+	angles = np.array(sorted(results))
+	costs = np.array([results[a] for a in angles])
+	best = np.argmin(costs)
+
+	return SweepResult(np.array([np.cos(angles[best]), np.sin(angles[best])]), angles[best], costs[best], angles, costs)
+
+def _sweep_cost(angle):
+	state = _worker_state('sweep')
+
+	# Each process plans routes over its own planner, built on first use
+	if 'planner' not in state:
+		state['planner'] = _free_space_planner(state['free_space'])
+
+	path = _sweep_path(state['free_space'], (np.cos(angle), np.sin(angle)), state['spacing'], state['planner'])
+	if path.size < 2:
+		return np.inf
+
+	return float(state['heuristic'].path_cost(path)[0])
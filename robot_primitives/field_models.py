@@ -0,0 +1,220 @@
+import ast
+import numpy as np
+
+try:
+	import numexpr
+except ImportError:
+	numexpr = None
+
+# Below this many points the overhead of numexpr outweighs its fused evaluation
+_NUMEXPR_MIN_SIZE = 2**12
+
+# Functions available to model expressions, named as numexpr names them
+_EXPRESSION_FUNCTIONS = {
+	'where': np.where,
+	'abs': np.abs,
+	'sqrt': np.sqrt,
+	'exp': np.exp,
+	'log': np.log,
+	'sin': np.sin,
+	'cos': np.cos,
+	'arctan2': np.arctan2,
+}
+
+def _validate_expression(expression, params):
+	""" Reject expressions reaching beyond arithmetic on x, y, params and the expression functions,
+		 since models are loaded from serialized descriptions and their expressions evaluated
+	"""
+	try:
+		tree = ast.parse(expression, mode='eval')
+	except SyntaxError as e:
+		raise ValueError(f"Invalid field model expression {expression!r}: {e}") from None
+
+	allowed_names = set(params) | {'x', 'y'} | set(_EXPRESSION_FUNCTIONS)
+	for node in ast.walk(tree):
+		if isinstance(node, (ast.Attribute, ast.Subscript, ast.Lambda)):
+			raise ValueError(f"Field model expression {expression!r} may not contain {type(node).__name__.lower()}s")
+		if isinstance(node, ast.Name) and node.id not in allowed_names:
+			raise ValueError(f"Unknown name {node.id} in field model expression {expression!r}, "
+				f"expressions may only use x, y, their parameters and {', '.join(_EXPRESSION_FUNCTIONS)}")
+
+class FieldModel:
+	""" Declarative flow model: a scalar magnitude expression in x, y and named
+		 parameters, scaling a constant unit flow direction. Models hold only
+		 plain parameters so they pickle, and the expression is evaluated for
+		 all points in one fused numexpr kernel when numexpr is installed,
+		 otherwise in one NumPy expression
+	"""
+
+	_compiled = {}
+
+	def __init__(self, expression, direction, **params):
+		direction = np.array(direction, dtype=float)
+		self._expression = expression
+		self._direction = direction / np.linalg.norm(direction)
+		self._params = {k:float(v) for k,v in params.items()}
+		_validate_expression(expression, self._params)
+
+	def __call__(self, x, y):
+		""" Flow vector at a single point """
+		value = self.evaluate(np.array([x], dtype=float), np.array([y], dtype=float))[0]
+		return tuple(value.tolist())
+
+	def __eq__(self, other):
+		return (type(self) is type(other) and self._expression == other._expression
+					and np.array_equal(self._direction, other._direction) and self._params == other._params)
+
+	def __hash__(self):
+		return hash((type(self), self._expression, tuple(self._direction.tolist()), tuple(sorted(self._params.items()))))
+
+	def __repr__(self):
+		params = ', '.join(f"{k}={v!r}" for k,v in self._params.items())
+		return f"{type(self).__name__}({self._expression!r}, direction={tuple(self._direction.tolist())}, {params})"
+
+	def magnitude(self, x, y):
+		""" Flow magnitude at arrays of x and y coords """
+		x = np.asarray(x, dtype=float)
+		y = np.asarray(y, dtype=float)
+		variables = dict(self._params, x=x, y=y)
+
+		if numexpr is not None and x.size >= _NUMEXPR_MIN_SIZE:
+			magnitude = numexpr.evaluate(self._expression, local_dict=variables, global_dict={})
+		else:
+			code = FieldModel._compiled.get(self._expression)
+			if code is None:
+				code = FieldModel._compiled[self._expression] = compile(self._expression, '<field model>', 'eval')
+			magnitude = eval(code, {'__builtins__': {}, **_EXPRESSION_FUNCTIONS}, variables)
+
+		return np.broadcast_to(magnitude, x.shape)
+
+	def evaluate(self, x, y):
+		""" (N,2) array of flow vectors at arrays of x and y coords """
+		return self.magnitude(x, y)[:,np.newaxis] * self._direction
+
+	def to_dict(self):
+		return {'expression':self._expression, 'direction':self._direction.tolist(), 'params':dict(self._params)}
+
+	@classmethod
+	def from_dict(cls, description):
+		return FieldModel(description['expression'], description['direction'], **description['params'])
+
+	@property
+	def expression(self):
+		return self._expression
+
+	@property
+	def direction(self):
+		return self._direction
+
+	@property
+	def params(self):
+		return dict(self._params)
+
+
+class UniformModel(FieldModel):
+	""" Constant flow everywhere """
+
+	def __init__(self, flow_vector):
+		flow_vector = np.array(flow_vector, dtype=float)
+		speed = np.linalg.norm(flow_vector)
+		direction = flow_vector if speed > 0 else (1., 0.)
+
+		super().__init__('speed + 0.*x', direction, speed=speed)
+
+
+class ChannelModel(FieldModel):
+	""" Parabolic channel profile across an axis through origin, zero at the banks
+		 a distance channel_width/2 either side of the axis and max_velocity along it
+	"""
+
+	def __init__(self, origin, axis_vector, channel_width, max_velocity):
+		axis_vector = np.array(axis_vector, dtype=float)
+		normal = np.array([axis_vector[1], -axis_vector[0]]) / np.linalg.norm(axis_vector)
+
+		# Offset of a point from the near bank, from its signed distance to the axis
+		d = '(x*nx + y*ny - c + w/2.)'
+		super().__init__(f"(4. * {d} / w - 4. * {d}**2 / w**2) * v_max", axis_vector, nx=normal[0], ny=normal[1],
+			c=np.dot(origin, normal), w=channel_width, v_max=max_velocity)
+
+
+class ExtendedChannelModel(FieldModel):
+	""" Channel profile falling quadratically from max_velocity on the axis to
+		 min_velocity a distance channel_width/2 from it and continuing beyond
+	"""
+
+	def __init__(self, origin, axis_vector, channel_width, max_velocity, min_velocity=0.):
+		axis_vector = np.array(axis_vector, dtype=float)
+		normal = np.array([axis_vector[1], -axis_vector[0]]) / np.linalg.norm(axis_vector)
+
+		w = channel_width / 2.
+		a = (min_velocity - max_velocity)/(w**2)
+		b = (min_velocity - max_velocity)/w - a*w
+
+		# Unsigned distance from the axis
+		d = 'abs(x*nx + y*ny - c)'
+		super().__init__(f"a*{d}**2 + b*{d} + v_max", axis_vector, nx=normal[0], ny=normal[1],
+			c=np.dot(origin, normal), a=a, b=b, v_max=max_velocity)
+
+
+class LinearModel(FieldModel):
+	""" Speed varying linearly with the unsigned projection of a point onto perpendicular,
+		 from v1 at projection x1 at a rate of slope
+	"""
+
+	def __init__(self, flow_direction, perpendicular, v1, slope, x1):
+		perpendicular = np.array(perpendicular, dtype=float)
+		perpendicular = perpendicular / np.linalg.norm(perpendicular)
+
+		super().__init__('v1 + slope * (abs(x*px + y*py) - x1)', flow_direction,
+			px=perpendicular[0], py=perpendicular[1], v1=v1, slope=slope, x1=x1)
+
+
+class PolynomialModel(FieldModel):
+	""" Speed given by a polynomial in the projection of a point onto the perpendicular of
+		 flow_direction. The polynomial is evaluated in Horner form after the linear map
+		 s -> offset + scale*s, as numpy.polynomial.Polynomial does for fitted polynomials
+	"""
+
+	def __init__(self, flow_direction, coefficients, offset=0., scale=1.):
+		flow_direction = np.array(flow_direction, dtype=float)
+		flow_direction = flow_direction / np.linalg.norm(flow_direction)
+
+		coefficients = np.atleast_1d(np.array(coefficients, dtype=float))
+		s = '(offset + scale*(x*px + y*py))'
+		expression = f"c{len(coefficients)-1}"
+		for i in reversed(range(len(coefficients) - 1)):
+			expression = f"c{i} + {s}*({expression})"
+
+		params = {f"c{i}":c for i,c in enumerate(coefficients)}
+		super().__init__(f"{expression} + 0.*x", flow_direction, px=-flow_direction[1], py=flow_direction[0],
+			offset=offset, scale=scale, **params)
+
+	@classmethod
+	def fit(cls, flow_direction, measurement_pts, flow_speeds, poly_deg):
+		""" Least squares fit of flow_speeds measured at measurement_pts """
+		flow_direction = np.array(flow_direction, dtype=float)
+		flow_direction = flow_direction / np.linalg.norm(flow_direction)
+		perpendicular = np.array([-flow_direction[1], flow_direction[0]])
+
+		proj_pts = np.asarray(measurement_pts, dtype=float) @ perpendicular
+		polynomial = np.polynomial.Polynomial.fit(proj_pts, flow_speeds, poly_deg)
+		offset, scale = polynomial.mapparms()
+
+		return cls(flow_direction, polynomial.coef, offset, scale)
+
+
+class PylonModel(FieldModel):
+	""" Channel flow in the y direction across x in [0, channel_width], falling linearly
+		 to zero at the center of a pylon spanning pylon_bounds from the channel
+		 speed at either side of it
+	"""
+
+	def __init__(self, channel_width, max_velocity, pylon_bounds):
+		channel = '(4. * x / w - 4. * x**2 / w**2) * v_max'
+		before_center = '(f0 - 2.*(x - p0)*f0/pw)'
+		after_center = '(2.*(x - p0 - pw/2.)*f1/pw)'
+		expression = f"where((x < p0) | (x > p1), {channel}, where(x < p0 + pw/2., {before_center}, {after_center}))"
+
+		channel_flow = lambda x: (4 * x / channel_width - 4 * x**2 / channel_width**2) * max_velocity
+		super().__init__(expression, (0., 1.), w=channel_width, v_max=max_velocity, p0=pylon_bounds[0], p1=pylon_bounds[1],
+			pw=pylon_bounds[1] - pylon_bounds[0], f0=channel_flow(pylon_bounds[0]), f1=channel_flow(pylon_bounds[1]))
@@ -1,46 +1,236 @@
+import numbers
 import numpy as np
+from abc import abstractmethod
+import shapely
 import shapely.geometry
 
-from .base import Field
+from .base import Field, _ragged_arange
+from .field_models import FieldModel, UniformModel, ChannelModel, ExtendedChannelModel, LinearModel, PolynomialModel, PylonModel
+
+def _ray_cross_sections(edges, origin_inside, angles):
+	""" Distances along rays at angles from the origin to the near and far ends of the first
+		 stretch of each ray inside the region, nan where a ray misses the region
+
+		 edges is an (E,2,2) array of the region edges relative to the origin. Each edge not
+		 in line with the origin covers the ray angles from its first to its second end
+		 counterclockwise, taken half open so rays through a vertex cross one edge there.
+		 Rays are sorted so each edge finds the rays it crosses by searching their angles,
+		 and all crossings are then ordered along their rays at once
+	"""
+	order = np.argsort(angles)
+	sorted_angles = angles[order]
+
+	# Edges start at their clockwise end and span less than half a turn, rays are
+	# repeated a turn later to catch spans wrapping past pi
+	a, b = edges[:,0], edges[:,1]
+	turn = a[:,0]*b[:,1] - a[:,1]*b[:,0]
+	a, b = np.where((turn < 0.)[:,np.newaxis], b, a), np.where((turn < 0.)[:,np.newaxis], a, b)
+	a, b = a[turn != 0.], b[turn != 0.]
+
+	low = np.arctan2(a[:,1], a[:,0])
+	high = np.arctan2(b[:,1], b[:,0])
+	high = np.where(high < low, high + 2*np.pi, high)
+
+	wrapped = np.concatenate((sorted_angles, sorted_angles + 2*np.pi))
+	first = np.searchsorted(wrapped, low, side='left')
+	counts = np.searchsorted(wrapped, high, side='left') - first
+
+	# One entry per crossing of a ray by an edge, at distance cross(a, e) / cross(d, e)
+	edge = np.repeat(np.arange(len(a)), counts)
+	ray = order[_ragged_arange(counts, first) % len(angles)]
+	directions = np.column_stack((np.cos(angles), np.sin(angles)))[ray]
+	e = b[edge] - a[edge]
+	distance = (a[edge,0]*e[:,1] - a[edge,1]*e[:,0]) / (directions[:,0]*e[:,1] - directions[:,1]*e[:,0])
+
+	crossings = np.lexsort((distance, ray))
+	ray, distance = ray[crossings], distance[crossings]
+	ray_starts = np.searchsorted(ray, np.arange(len(angles)))
+	ray_counts = np.diff(np.append(ray_starts, len(ray)))
+
+	radii = np.full((len(angles), 2), np.nan)
+	if origin_inside:
+		# The first stretch runs from the origin to the first crossing
+		hit = ray_counts > 0
+		radii[hit, 0] = 0.
+		radii[hit, 1] = distance[ray_starts[hit]]
+		return radii
+
+	# Crossings pair up into stretches, those of zero length come from rays grazing a vertex
+	position = np.arange(len(ray)) - ray_starts[ray]
+	stretch = np.flatnonzero((position % 2 == 0) & (position + 1 < ray_counts[ray]))
+	stretch = stretch[distance[stretch + 1] > distance[stretch]]
+	hit_rays, first_stretch = np.unique(ray[stretch], return_index=True)
+	radii[hit_rays, 0] = distance[stretch[first_stretch]]
+	radii[hit_rays, 1] = distance[stretch[first_stretch] + 1]
+
+	return radii
+
+def _cross_section_table(bounding_region, origin, num_angles=360, tolerance=None, max_refinements=30):
+	""" Tabulate the cross section of the region along rays from origin against ray angle
+
+		Starts from a uniform set of angles plus the angles of the region vertices, where
+		the cross section bends or jumps, and bisects any interval over which linear
+		interpolation misses the true cross section at its midpoint by more than tolerance
+
+		Returns sorted angles in [-pi, pi) and an (M,2) array of the distances from origin
+		to the near and far ends of the cross section at each angle, nan where rays miss
+	"""
+	vertices = np.asarray(bounding_region.vertices, dtype=float) - origin
+	edges = np.stack((vertices, np.roll(vertices, -1, axis=0)), axis=1)
+	origin_inside = bounding_region.contains_point(origin)
+	if tolerance is None:
+		tolerance = 1e-6 * (np.linalg.norm(vertices, axis=1).max() + 1.0)
+
+	# Bracket each vertex angle closely to capture jumps where rays graze a vertex
+	vertex_angles = np.arctan2(vertices[:,1], vertices[:,0])
+	angles = np.concatenate((np.linspace(-np.pi, np.pi, num_angles, endpoint=False), vertex_angles - 1e-9, vertex_angles, vertex_angles + 1e-9))
+	angles = np.unique((angles + np.pi) % (2*np.pi) - np.pi)
+	radii = _ray_cross_sections(edges, origin_inside, angles)
+
+	for _ in range(max_refinements):
+		# Interval midpoints, including the interval wrapping around from the last angle to the first
+		next_angles = np.append(angles[1:], angles[0] + 2*np.pi)
+		next_radii = np.vstack((radii[1:], radii[:1]))
+		wide = next_angles - angles > 1e-12
+		midpoints = 0.5 * (angles[wide] + next_angles[wide])
+		mid_radii = _ray_cross_sections(edges, origin_inside, midpoints)
+
+		interpolated = 0.5 * (radii[wide] + next_radii[wide])
+		with np.errstate(invalid='ignore'):
+			error = np.abs(mid_radii - interpolated) > tolerance
+		error |= np.isnan(mid_radii) != np.isnan(interpolated)
+		refine = error.any(axis=1)
+		if not refine.any():
+			break
+
+		midpoints = (midpoints[refine] + np.pi) % (2*np.pi) - np.pi
+		angles = np.concatenate((angles, midpoints))
+		radii = np.vstack((radii, mid_radii[refine]))
+		order = np.argsort(angles)
+		angles, radii = angles[order], radii[order]
+
+	return angles, radii
+
+def _lookup_cross_sections(table, angles):
+	""" Near and far cross section distances at angles, interpolated from a cross section table """
+	table_angles, table_radii = table
+	near = np.interp(angles, table_angles, table_radii[:,0], period=2*np.pi)
+	far = np.interp(angles, table_angles, table_radii[:,1], period=2*np.pi)
+
+	return near, far
+
+def _as_vector(value):
+	""" value as a flow vector, None when it is not a length 2 vector of numbers """
+	try:
+		vector = np.asarray(value, dtype=float)
+	except (TypeError, ValueError):
+		return None
+
+	return vector if vector.shape == (2,) else None
 
 class VectorField(Field):
 
-	def __init__(self, field_func):
+	# Make numpy arrays defer to the field operators instead of broadcasting over the field
+	__array_ufunc__ = None
+
+	def __init__(self, field_func, batch_func=None):
 		self._field_func = field_func
+		self._batch_func = batch_func
+
+	@classmethod
+	def from_model(cls, model, *args, **kwargs):
+		""" Field evaluating a FieldModel, one point at a time or in batches """
+		return cls(model, *args, batch_func=model.evaluate, **kwargs)
 
 	@classmethod
 	def from_uniform_vector(cls, flow_vector):
-		field_func = lambda x,y: flow_vector
-		return cls(field_func)
+		return cls.from_model(UniformModel(flow_vector))
 
 	@classmethod
 	def from_channel_flow_model(cls, channel_width, max_velocity, offset=(0,0)):
 		x0,y0 = offset
-		field_func = lambda x,y: (0, ((4 * (x - x0) / channel_width - 4 * (x - x0)**2 / channel_width**2) * max_velocity))
 
-		return cls(field_func)
+		# Flow along y with the channel spanning x0 to x0 + channel_width
+		return cls.from_model(ChannelModel((x0 + channel_width/2, y0), (0., 1.), channel_width, max_velocity))
 
 	@classmethod
 	def from_channel_flow_with_pylon(cls, channel_width, max_velocity, pylon_bounds):
-		channel_flow = lambda x: (4 * x / channel_width - 4 * x**2 / channel_width**2) * max_velocity
+		return cls.from_model(PylonModel(channel_width, max_velocity, pylon_bounds))
 
-		pylon_width = pylon_bounds[1] - pylon_bounds[0]
+	def __getitem__(self, index):
+		return self._field_func(*index)
 
-		pylon_boundary_flow = [channel_flow(x) for x in pylon_bounds]
+	def sample(self, points):
+		"""Sample field at an (N,2) array of points, returns (N,2) array of values"""
+		points = np.asarray(points, dtype=float).reshape(-1, 2)
+		return self._evaluate(points)
 
-		pylon_flow = lambda x: pylon_boundary_flow[0] - 2*(x-pylon_bounds[0])*pylon_boundary_flow[0]/pylon_width if x < pylon_bounds[0] + pylon_width/2 else 2*(x-pylon_bounds[0]-pylon_width/2)*pylon_boundary_flow[1]/pylon_width
+	def _evaluate(self, points):
+		# Fields built from a bare function fall back to per point evaluation
+		if self._batch_func is None:
+			return np.array([self._field_func(x, y) for x, y in points], dtype=float).reshape(-1, 2)
 
-		compound_flow = lambda x,y: (0, channel_flow(x)) if x < pylon_bounds[0] or x > pylon_bounds[1] else (0, pylon_flow(x))
+		return np.asarray(self._batch_func(points[:,0], points[:,1]), dtype=float).reshape(-1, 2)
 
-		return cls(compound_flow)
+	@property
+	def model(self):
+		""" FieldModel the field evaluates, None for fields built from functions """
+		return self._field_func if isinstance(self._field_func, FieldModel) else None
 
-	def __getitem__(self, index):
-		return self._field_func(*index)
+	def __add__(self, other):
+		if not isinstance(other, Field):
+			vector = _as_vector(other)
+			if vector is None:
+				return NotImplemented
+			other = VectorField.from_uniform_vector(vector)
+
+		return SumField([self, other])
+
+	def __radd__(self, other):
+		# Allow sum() over fields, which starts from 0
+		if isinstance(other, numbers.Number) and other == 0:
+			return self
+
+		return self.__add__(other)
+
+	def __sub__(self, other):
+		if not isinstance(other, Field):
+			vector = _as_vector(other)
+			if vector is None:
+				return NotImplemented
+			return self + (-vector)
+
+		return self + (-other)
+
+	def __rsub__(self, other):
+		return (-self).__add__(other)
+
+	def __mul__(self, scale):
+		if not isinstance(scale, numbers.Real):
+			return NotImplemented
+
+		return ScaledField(self, scale)
+
+	__rmul__ = __mul__
+
+	def __truediv__(self, scale):
+		if not isinstance(scale, numbers.Real):
+			return NotImplemented
+
+		return ScaledField(self, 1. / scale)
+
+	def __neg__(self):
+		return ScaledField(self, -1.)
+
+	def override(self, region, field):
+		""" Field taking the values of field inside region and of this field elsewhere """
+		return OverrideField(self, field, region)
 
 class BoundedVectorField(VectorField):
 
-	def __init__(self, field_func, bounding_region, undefined_value=(0.,0.)):
+	def __init__(self, field_func, bounding_region, undefined_value=(0.,0.), batch_func=None):
 		self._field_func = field_func
+		self._batch_func = batch_func
 		self._bounding_region = bounding_region
 		self._undefined_value = undefined_value
 
@@ -62,14 +252,9 @@ class BoundedVectorField(VectorField):
 
 			print(f"channel_width: {channel_width}")
 
-		dist = lambda x,y: np.cross(np.array([x-center_axis[0][0], y - center_axis[0][1]]), center_axis_vector)/center_axis_length
-
-		#field_magnitude = lambda x,y: (4 * (dist(x,y)) / channel_width - 4 * (dist(x,y))**2 / channel_width**2) * max_velocity
-		field_magnitude = lambda x,y: (4 * (dist(x,y)+channel_width/2) / channel_width - 4 * (dist(x,y)+channel_width/2)**2 / channel_width**2) * max_velocity
+		model = ChannelModel(center_axis[0], center_axis_vector, channel_width, max_velocity)
 
-		field_func = lambda x,y: tuple(field_magnitude(x,y)*center_axis_direction)
-
-		return cls(field_func, bounding_region, **other_args)
+		return cls.from_model(model, bounding_region, **other_args)
 
 	@classmethod
 	def extended_channel_flow_model(cls, bounding_region, center_axis, max_velocity, min_velocity=0., channel_width=None, **other_args):
@@ -90,20 +275,9 @@ class BoundedVectorField(VectorField):
 
 			print(f"channel_width: {channel_width}")
 
-		# Distance of a point (x,y) to the center axis line using cross product
-		dist = lambda x,y: np.linalg.norm(np.cross(np.array([x-center_axis[0][0], y - center_axis[0][1]]), center_axis_vector))/center_axis_length
-
-		w = channel_width / 2.
-		a = (min_velocity - max_velocity)/(w**2)
-		b = (min_velocity - max_velocity)/w - a*w
-		print(f"a: {a}, b: {b}")
-		field_magnitude = lambda x,y: a*dist(x,y)**2 + b*dist(x,y) + max_velocity
-		#field_magnitude = lambda x,y: (4 * (dist(x,y)) / channel_width - 4 * (dist(x,y))**2 / channel_width**2) * max_velocity
-		#field_magnitude = lambda x,y: (4 * (dist(x,y)+channel_width/2) / channel_width - 4 * (dist(x,y)+channel_width/2)**2 / channel_width**2) * max_velocity
+		model = ExtendedChannelModel(center_axis[0], center_axis_vector, channel_width, max_velocity, min_velocity)
 
-		field_func = lambda x,y: tuple(field_magnitude(x,y)*center_axis_direction)
-
-		return cls(field_func, bounding_region, **other_args)
+		return cls.from_model(model, bounding_region, **other_args)
 
 	"""
 	@classmethod
@@ -150,29 +324,17 @@ class BoundedVectorField(VectorField):
 
 		slope = (v2 - v1) / projected_region_width
 
-		projected_dist = lambda x,y: abs(np.dot(np.array([x,y]), perpendicular_direction)) - x1
-
-		field_magnitude = lambda x,y: v1 + slope * projected_dist(x,y)
+		model = LinearModel(flow_axis_direction, perpendicular_direction, v1, slope, x1)
 
-		field_func = lambda x,y: tuple(field_magnitude(x,y)*flow_axis_direction)
-
-		return cls(field_func, bounding_region, **other_args)
+		return cls.from_model(model, bounding_region, **other_args)
 
 	@classmethod
 	def unidirectional_poly_flow_model(cls, bounding_region, flow_dir, measurement_pts, flow_speeds, poly_deg, **other_args):
 		#flow_axis_vector = np.array([flow_axis[1][0] - flow_axis[0][0], flow_axis[1][1] - flow_axis[0][1]])
 		#flow_axis_length = np.linalg.norm(flow_axis_vector)
-		flow_dir /= np.linalg.norm(flow_dir)
-		perp_flow_dir = np.array([-flow_dir[1], flow_dir[0]])
-
-		proj_pts = [np.dot(pt, perp_flow_dir) for pt in measurement_pts]
-		field_magnitude = np.polynomial.Polynomial.fit(proj_pts, flow_speeds, poly_deg)
-
-		projected_dist = lambda x,y: np.dot(np.array([x,y]), perp_flow_dir)
-
-		field_func = lambda x,y: tuple(field_magnitude(projected_dist(x,y))*flow_dir)
+		model = PolynomialModel.fit(flow_dir, measurement_pts, flow_speeds, poly_deg)
 
-		return cls(field_func, bounding_region, **other_args)
+		return cls.from_model(model, bounding_region, **other_args)
 
 	def __getitem__(self, index):
 		#Todo: remove this once it is verified new contains point method works
@@ -183,6 +345,31 @@ class BoundedVectorField(VectorField):
 		else:
 			return self._field_func(*index)
 
+	def sample(self, points):
+		"""Sample field at an (N,2) array of points, returns (N,2) array of values
+
+			Bounds are tested for all points at once and the field is only
+			evaluated at points lying within the bounding region
+		"""
+		points = np.asarray(points, dtype=float).reshape(-1, 2)
+		inside = self._bounding_region.contains_points(points)
+
+		values = np.empty(points.shape, dtype=float)
+		values[~inside] = self._undefined_value
+
+		if inside.any():
+			values[inside] = self._evaluate(points[inside])
+
+		return values
+
+	def rasterize(self, resolution):
+		""" Precompute field over a regular grid covering the bounding region """
+		return GriddedVectorField.from_field(self, resolution)
+
+	@property
+	def boundary(self):
+		return self._bounding_region
+
 	@property
 	def undefined_value(self):
 		return self._undefined_value
@@ -199,8 +386,8 @@ class RadialChannelField(BoundedVectorField):
 		self._origin = np.array(origin)
 		self._undefined_value = undefined_value
 
-		# Precompute sweep line distance that will cross entire domain regardless of origin
-		self._region_diameter = self._bounding_region.diameter + 1.0
+		# Cross section of the region depends only on the angle of a point around origin
+		self._cross_section_table = _cross_section_table(self._bounding_region, self._origin)
 
 		self._min_vel = min_vel
 		self._max_vel = max_vel
@@ -211,20 +398,21 @@ class RadialChannelField(BoundedVectorField):
 		return a*dist**2 + b*dist + self._max_vel
 
 	def _field_func(self, x, y):
-		pt = np.array((x,y))
-		pt_vec = pt - self._origin
-		sweep_vec = pt_vec/np.linalg.norm(pt_vec) * self._region_diameter + self._origin
-		cross_section = self._bounding_region.compute_intersection(shapely.geometry.LineString([self._origin, sweep_vec]))
+		return tuple(self._batch_func(np.array([x], dtype=float), np.array([y], dtype=float))[0].tolist())
 
-		cross_vec = cross_section[1] - cross_section[0]
-		cross_len = np.linalg.norm(cross_vec)
-		midpoint = 0.5 * cross_vec + cross_section[0]
+	def _batch_func(self, x, y):
+		pt_vec = np.column_stack((x, y)) - self._origin
+		pt_len = np.linalg.norm(pt_vec, axis=1)
+		near, far = _lookup_cross_sections(self._cross_section_table, np.arctan2(pt_vec[:,1], pt_vec[:,0]))
 
-		dist = np.linalg.norm(pt - midpoint)
+		cross_len = np.abs(far - near)
+		dist = np.abs(pt_len - 0.5 * (near + far))
 		flow_magnitude = self._field_magnitude(cross_len/2., dist)
-		flow_direction = np.array([pt_vec[1], -pt_vec[0]])/np.linalg.norm(pt_vec)
 
-		return tuple(flow_magnitude*flow_direction)
+		with np.errstate(invalid='ignore', divide='ignore'):
+			flow_direction = np.column_stack((pt_vec[:,1], -pt_vec[:,0]))/pt_len[:,np.newaxis]
+
+		return flow_magnitude[:,np.newaxis]*flow_direction
 
 class AsymmetricRadialChannelField(BoundedVectorField):
 
@@ -234,8 +422,8 @@ class AsymmetricRadialChannelField(BoundedVectorField):
 		self._undefined_value = undefined_value
 		self._center_ratios = center_ratios
 
-		# Precompute sweep line distance that will cross entire domain regardless of origin
-		self._region_diameter = self._bounding_region.diameter + 1.0
+		# Cross section of the region depends only on the angle of a point around origin
+		self._cross_section_table = _cross_section_table(self._bounding_region, self._origin)
 
 		self._min_vel = min_vel
 		self._max_vel = max_vel
@@ -246,34 +434,294 @@ class AsymmetricRadialChannelField(BoundedVectorField):
 		return a*dist**2 + b*dist + self._max_vel
 
 	def _field_func(self, x, y):
-		pt = np.array((x,y))
-		pt_vec = pt - self._origin
-		pt_len = np.linalg.norm(pt_vec)
-
-		angle = np.arctan2(pt_vec[1], pt_vec[0])
-		center_ratio = np.linalg.norm((self._center_ratios[0]*np.cos(angle), self._center_ratios[1]*np.sin(angle)))
-
-		sweep_vec = pt_vec/pt_len * self._region_diameter + self._origin
-		cross_section = self._bounding_region.compute_intersection(shapely.geometry.LineString([self._origin, sweep_vec]))
-
-		cross_vec = cross_section[1] - cross_section[0]
-		cross_len = np.linalg.norm(cross_vec)
-		center_point = center_ratio * cross_vec + cross_section[0]
-		center_point_vec = center_point - self._origin
-		center_point_len = np.linalg.norm(center_point_vec)
-
-		flow_magnitude = 0.
-		if pt_len > center_point_len:
-			# pt on outer bank side of flow center
-			dist = pt_len - center_point_len
-			width = (1. - center_ratio) * cross_len
-			flow_magnitude = self._field_magnitude(width, dist)
-		else:
-			# pt on inner bank side of flow center
-			dist = center_point_len - pt_len
-			width = center_ratio * cross_len
-			flow_magnitude = self._field_magnitude(width, dist)
+		return tuple(self._batch_func(np.array([x], dtype=float), np.array([y], dtype=float))[0].tolist())
+
+	def _batch_func(self, x, y):
+		pt_vec = np.column_stack((x, y)) - self._origin
+		pt_len = np.linalg.norm(pt_vec, axis=1)
+
+		angle = np.arctan2(pt_vec[:,1], pt_vec[:,0])
+		center_ratio = np.hypot(self._center_ratios[0]*np.cos(angle), self._center_ratios[1]*np.sin(angle))
+		near, far = _lookup_cross_sections(self._cross_section_table, angle)
+
+		cross_len = np.abs(far - near)
+		center_point_len = np.abs(near + center_ratio * (far - near))
+
+		# Points beyond the flow center lie on the outer bank side
+		outer_bank = pt_len > center_point_len
+		dist = np.abs(pt_len - center_point_len)
+		width = np.where(outer_bank, (1. - center_ratio) * cross_len, center_ratio * cross_len)
+		flow_magnitude = self._field_magnitude(width, dist)
+
+		with np.errstate(invalid='ignore', divide='ignore'):
+			flow_direction = np.column_stack((pt_vec[:,1], -pt_vec[:,0]))/pt_len[:,np.newaxis]
+
+		return flow_magnitude[:,np.newaxis]*flow_direction
+
+class GriddedVectorField(BoundedVectorField):
+	""" A field evaluated once over a regular grid covering its bounding region
+		 and answered by bilinear interpolation of the stored samples
+	"""
+
+	def __init__(self, grid, origin, resolution, bounding_region, undefined_value=(0.,0.), max_error=None):
+		self._grid = np.asarray(grid, dtype=np.float32)
+		self._origin = np.array(origin, dtype=float)
+		self._resolution = float(resolution)
+		self._bounding_region = bounding_region
+		self._undefined_value = undefined_value
+		self._max_error = max_error
+
+	@classmethod
+	def from_field(cls, field, resolution):
+		min_x, min_y, max_x, max_y = field._bounding_region.bounds
+		num_x = max(int(np.ceil((max_x - min_x) / resolution)) + 1, 2)
+		num_y = max(int(np.ceil((max_y - min_y) / resolution)) + 1, 2)
+
+		xs = min_x + resolution * np.arange(num_x)
+		ys = min_y + resolution * np.arange(num_y)
+		grid_x, grid_y = np.meshgrid(xs, ys)
+		nodes = np.column_stack((grid_x.ravel(), grid_y.ravel()))
+
+		# Evaluate the unbounded field at every node so cells straddling the
+		# boundary interpolate the analytic field instead of the undefined value
+		with np.errstate(divide='ignore', invalid='ignore'):
+			values = VectorField.sample(field, nodes)
+		undefined = ~np.all(np.isfinite(values), axis=1)
+		values[undefined] = field.undefined_value
+
+		gridded_field = cls(values.reshape(num_y, num_x, 2), (min_x, min_y), resolution, field._bounding_region, field.undefined_value)
+
+		gridded_field._max_error = gridded_field._interpolation_error(field)
+
+		return gridded_field
+
+	def _interpolation_error(self, field):
+		""" Largest difference from field over the cell corners, edge midpoints and centers inside
+			 the bounding region, and points every half cell along its boundary, so cells
+			 straddling the boundary are checked where they are clipped
+		"""
+		num_y, num_x = self._grid.shape[:2]
+		half = self._resolution / 2.
+		xs = self._origin[0] + half * np.arange(2 * num_x - 1)
+		ys = self._origin[1] + half * np.arange(2 * num_y - 1)
+		grid_x, grid_y = np.meshgrid(xs, ys)
+		points = np.column_stack((grid_x.ravel(), grid_y.ravel()))
+		points = points[self._bounding_region.contains_points(points)]
+
+		rings = shapely.get_rings(shapely.segmentize(self._bounding_region.polygon, half))
+		points = np.vstack((points, shapely.get_coordinates(rings)))
+		if len(points) == 0:
+			return 0.
+
+		with np.errstate(divide='ignore', invalid='ignore'):
+			error = np.linalg.norm(self.sample(points) - field.sample(points), axis=1)
+
+		return float(np.nanmax(error)) if np.isfinite(error).any() else 0.
 
-		flow_direction = np.array([pt_vec[1], -pt_vec[0]])/pt_len
+	def _interpolate(self, points):
+		num_y, num_x = self._grid.shape[:2]
+		fx = (points[:,0] - self._origin[0]) / self._resolution
+		fy = (points[:,1] - self._origin[1]) / self._resolution
 
-		return tuple(flow_magnitude*flow_direction)
\ No newline at end of file
+		ix = np.clip(np.floor(fx).astype(np.intp), 0, num_x - 2)
+		iy = np.clip(np.floor(fy).astype(np.intp), 0, num_y - 2)
+		tx = (fx - ix)[:,np.newaxis]
+		ty = (fy - iy)[:,np.newaxis]
+
+		g = self._grid
+		bottom = (1. - tx) * g[iy, ix] + tx * g[iy, ix+1]
+		top = (1. - tx) * g[iy+1, ix] + tx * g[iy+1, ix+1]
+
+		return (1. - ty) * bottom + ty * top
+
+	def _field_func(self, x, y):
+		return tuple(self._interpolate(np.array([[x, y]], dtype=float))[0])
+
+	def _batch_func(self, x, y):
+		return self._interpolate(np.column_stack((x, y)))
+
+	@property
+	def grid(self):
+		return self._grid
+
+	@property
+	def origin(self):
+		return self._origin
+
+	@property
+	def resolution(self):
+		return self._resolution
+
+	@property
+	def max_error(self):
+		""" Maximum interpolation error against the analytic field it was built from, measured
+			 at sample points down to half a cell apart, so error spikes narrower than that
+			 such as jumps in the field may be underestimated
+		"""
+		return self._max_error
+
+
+def _bounds_overlap(area, bounds):
+	""" Whether the bounding box of area overlaps bounds, areas without bounds overlap everything """
+	if area is None:
+		return True
+
+	min_x, min_y, max_x, max_y = area.bounds
+	return min_x <= bounds[2] and bounds[0] <= max_x and min_y <= bounds[3] and bounds[1] <= max_y
+
+def _points_bounds(points):
+	return (*points.min(axis=0), *points.max(axis=0))
+
+class CompositeVectorField(VectorField):
+	""" Field combining other fields lazily, each batch of points is passed through
+		 the layers once and every layer is evaluated over whole arrays of points
+	"""
+
+	def _field_func(self, x, y):
+		return tuple(self._batch_func(np.array([x], dtype=float), np.array([y], dtype=float))[0].tolist())
+
+	def _batch_func(self, x, y):
+		return self._combine(np.column_stack((x, y)))
+
+	@abstractmethod
+	def _combine(self, points):
+		""" Values of the combined field at an (N,2) array of points """
+		raise NotImplementedError()
+
+	@property
+	@abstractmethod
+	def layers(self):
+		raise NotImplementedError()
+
+class SumField(CompositeVectorField):
+	""" Superposition of fields, bounded layers are only evaluated at the points of a
+		 batch inside their region and contribute their undefined value elsewhere
+	"""
+
+	def __init__(self, fields):
+		self._fields = []
+		for field in fields:
+			self._fields.extend(field.layers if isinstance(field, SumField) else [field])
+
+	def _combine(self, points):
+		values = np.zeros(points.shape, dtype=float)
+		if len(points) == 0:
+			return values
+
+		bounds = _points_bounds(points)
+		for field in self._fields:
+			region = field.boundary
+			if region is None:
+				values += field.sample(points)
+				continue
+
+			inside = np.zeros(len(points), dtype=bool)
+			if _bounds_overlap(region, bounds):
+				inside = region.contains_points(points)
+
+			if inside.any():
+				values[inside] += field.sample(points[inside])
+			if not inside.all():
+				values[~inside] += np.asarray(getattr(field, 'undefined_value', (0., 0.)), dtype=float)
+
+		return values
+
+	@property
+	def layers(self):
+		return list(self._fields)
+
+class ScaledField(CompositeVectorField):
+	""" Field scaled by a constant factor """
+
+	def __init__(self, field, scale):
+		self._field = field
+		self._scale = float(scale)
+
+	def _combine(self, points):
+		return self._scale * self._field.sample(points)
+
+	@property
+	def layers(self):
+		return [self._field]
+
+	@property
+	def scale(self):
+		return self._scale
+
+class OverrideField(CompositeVectorField):
+	""" Field taking the values of override inside region and of base elsewhere,
+		 each field is only evaluated at the points it applies to
+	"""
+
+	def __init__(self, base, override, region):
+		self._base = base
+		self._override = override
+		self._region = region
+
+	def _combine(self, points):
+		values = np.empty(points.shape, dtype=float)
+		if len(points) == 0:
+			return values
+
+		inside = np.zeros(len(points), dtype=bool)
+		if _bounds_overlap(self._region, _points_bounds(points)):
+			inside = self._region.contains_points(points)
+
+		if inside.any():
+			values[inside] = self._override.sample(points[inside])
+		if not inside.all():
+			values[~inside] = self._base.sample(points[~inside])
+
+		return values
+
+	@property
+	def layers(self):
+		return [self._base, self._override]
+
+	@property
+	def region(self):
+		return self._region
+
+class PiecewiseField(CompositeVectorField):
+	""" Field defined piece by piece over regions, given as a list of (region, field) pairs.
+		 The first piece whose region contains a point gives its value, points outside
+		 every region take the value of default, or undefined_value without a default
+	"""
+
+	def __init__(self, pieces, default=None, undefined_value=(0.,0.)):
+		self._pieces = list(pieces)
+		self._default = default
+		self._undefined_value = undefined_value
+
+	def _combine(self, points):
+		values = np.empty(points.shape, dtype=float)
+		remaining = np.arange(len(points))
+
+		for region, field in self._pieces:
+			if len(remaining) == 0:
+				break
+
+			if not _bounds_overlap(region, _points_bounds(points[remaining])):
+				continue
+
+			inside = region.contains_points(points[remaining])
+			if inside.any():
+				values[remaining[inside]] = field.sample(points[remaining[inside]])
+				remaining = remaining[~inside]
+
+		if len(remaining) > 0:
+			if self._default is None:
+				values[remaining] = self._undefined_value
+			else:
+				values[remaining] = self._default.sample(points[remaining])
+
+		return values
+
+	@property
+	def layers(self):
+		fields = [field for _, field in self._pieces]
+		return fields if self._default is None else fields + [self._default]
+
+	@property
+	def pieces(self):
+		return list(self._pieces)
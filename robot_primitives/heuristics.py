@@ -1,10 +1,130 @@
 import numpy as np
+import collections
+import concurrent.futures
+import sys
 
 # import autograd.numpy as anp
 # from autograd import jacobian
 # from scipy.integrate import quad
 
-from .base import Heuristic
+from .base import Heuristic, _ragged_arange, _init_worker, _worker_state
+
+def _as_segments(start_points, end_points):
+	starts = np.asarray(start_points, dtype=float).reshape(-1, 2)
+	ends = np.asarray(end_points, dtype=float).reshape(-1, 2)
+
+	return starts, ends
+
+def _vector_norms(vectors):
+	""" Norms over the last axis, rounded as np.linalg.norm rounds a single vector so batched
+		 costs match the per segment loops they reproduce
+	"""
+	return np.sqrt((vectors[...,np.newaxis,:] @ vectors[...,:,np.newaxis])[...,0,0])
+
+def _chunk_bounds(counts, chunk_size):
+	""" Split consecutive items into [start, stop) ranges holding roughly chunk_size work each """
+	cumulative = np.cumsum(counts)
+	start = 0
+	while start < len(counts):
+		done = cumulative[start-1] if start > 0 else 0
+		stop = max(int(np.searchsorted(cumulative, done + chunk_size, side='right')), start + 1)
+		yield start, stop
+		start = stop
+
+def _accumulated_step_counts(starts, steps, lengths, max_steps, chunk_size):
+	""" Number of steps a loop accumulating its position from start + step takes before
+		 it is length from start, for segments that are about max_steps steps long
+
+		 Positions are accumulated with a cumsum along rows of steps padded to the longest
+		 segment in each chunk, which adds them in the same order as the loop does, so
+		 rounding decides the last step exactly as it does there
+	"""
+	counts = np.zeros(len(starts), dtype=np.intp)
+	order = np.argsort(max_steps, kind='stable')
+
+	for start, stop in _chunk_bounds(max_steps[order] + 2, chunk_size):
+		index = order[start:stop]
+		width = int(max_steps[index].max()) + 2
+
+		positions = np.zeros((len(index), width, 2))
+		positions[:,0] = starts[index] + steps[index]
+		in_segment = np.arange(1, width) <= max_steps[index,np.newaxis]
+		positions[:,1:] = np.where(in_segment[...,np.newaxis], steps[index,np.newaxis], 0.)
+		np.cumsum(positions, axis=1, out=positions)
+
+		reached = _vector_norms(positions - starts[index,np.newaxis]) >= lengths[index,np.newaxis]
+		counts[index] = np.argmax(reached, axis=1)
+
+	return counts
+
+def cost_matrix(heuristic, points, workers=None, rows_per_chunk=None, filename=None):
+	""" Compute the full NxN matrix of costs between every ordered pair of points
+
+		Rows of the matrix are split into chunks costed with compute_costs,
+		in a process pool when workers > 1. The heuristic and its field must
+		be picklable to be sent to the pool. Returns a dense float32 array,
+		or a float32 memmap backed by filename which the workers write into
+		directly when a filename is given
+	"""
+	points = np.asarray(points, dtype=float).reshape(-1, 2)
+	num_points = len(points)
+
+	if rows_per_chunk is None:
+		# Aim for chunks of ~2^18 edges while leaving several chunks per worker to balance load
+		rows_per_chunk = max(1, min(2**18 // max(num_points, 1), num_points // (4 * (workers or 1)) or 1))
+
+	if filename is not None:
+		matrix = np.lib.format.open_memmap(filename, mode='w+', dtype=np.float32, shape=(num_points, num_points))
+		matrix.flush()
+	else:
+		matrix = np.empty((num_points, num_points), dtype=np.float32)
+
+	chunks = [(start, min(start + rows_per_chunk, num_points)) for start in range(0, num_points, rows_per_chunk)]
+
+	if workers is None or workers <= 1:
+		_init_worker('cost_matrix', dict(heuristic=heuristic, points=points, filename=None))
+		for start, stop in chunks:
+			matrix[start:stop] = _cost_rows(start, stop)
+	else:
+		with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, 
+			initargs=('cost_matrix', dict(heuristic=heuristic, points=points, filename=filename))) as pool:
+			futures = {pool.submit(_cost_rows, start, stop):(start, stop) for start, stop in chunks}
+			for future in concurrent.futures.as_completed(futures):
+				rows = future.result()
+				if rows is not None:
+					start, stop = futures[future]
+					matrix[start:stop] = rows
+
+	_init_worker('cost_matrix', None)
+
+	if filename is not None:
+		matrix.flush()
+
+	return matrix
+
+def path_cost(path, heuristic, **kwargs):
+	""" Total and per segment cost of one path or a list of paths under heuristic,
+		 see Heuristic.path_cost
+	"""
+	return heuristic.path_cost(path, **kwargs)
+
+def _cost_rows(start, stop):
+	state = _worker_state('cost_matrix')
+	heuristic, points, filename = state['heuristic'], state['points'], state['filename']
+	num_points = len(points)
+
+	starts = np.repeat(points[start:stop], num_points, axis=0)
+	ends = np.tile(points, (stop - start, 1))
+	rows = heuristic.compute_costs(starts, ends).reshape(stop - start, num_points).astype(np.float32)
+	rows[np.arange(stop - start), np.arange(start, stop)] = 0.
+
+	if filename is None:
+		return rows
+
+	# Write straight into the shared memory mapped matrix instead of sending rows back
+	matrix = np.load(filename, mmap_mode='r+')
+	matrix[start:stop] = rows
+	matrix.flush()
 
 class EuclideanDistance(Heuristic):
 
@@ -12,6 +132,12 @@ class EuclideanDistance(Heuristic):
 	def compute_cost(start_point, end_point):
 		return np.linalg.norm(np.asarray(end_point)-np.asarray(start_point))
 
+	@staticmethod
+	def compute_costs(start_points, end_points):
+		starts, ends = _as_segments(start_points, end_points)
+
+		return np.linalg.norm(ends - starts, axis=1)
+
 
 class DirectedDistance(Heuristic):
 
@@ -34,13 +160,19 @@ class DirectedDistance(Heuristic):
 
 		return abs(scalar_proj)
 
+	def compute_costs(self, start_points, end_points):
+		starts, ends = _as_segments(start_points, end_points)
+
+		return np.abs((ends - starts) @ self._direction_vector)
+
 
 class OpposingFlowEnergy(Heuristic):
 
-	def __init__(self, flow_field, nominal_speed=0.5, delta=0.01):
+	def __init__(self, flow_field, nominal_speed=0.5, delta=0.01, chunk_size=2**20):
 		self._flow_field = flow_field
 		self._nominal_speed = nominal_speed
 		self._delta = delta
+		self._chunk_size = chunk_size
 
 	def compute_cost(self, start_point, end_point, nominal_speed=None):
 		if nominal_speed is None:
@@ -75,6 +207,70 @@ class OpposingFlowEnergy(Heuristic):
 
 		return total_cost
 
+	def compute_costs(self, start_points, end_points, nominal_speed=None):
+		""" Batched equivalent of compute_cost over (N,2) arrays of segment endpoints
+
+			Reproduces the fixed step loop of compute_cost for every segment but
+			gathers the step points of many segments into chunks of roughly
+			chunk_size points that are sampled from the field in one call
+		"""
+		if nominal_speed is None:
+			nominal_speed = self._nominal_speed
+
+		starts, ends = _as_segments(start_points, end_points)
+		diff = ends - starts
+		lengths = _vector_norms(diff)
+
+		nonzero = lengths > 0.
+		nominal_vels = np.zeros_like(diff)
+		nominal_vels[nonzero] = diff[nonzero] / lengths[nonzero,np.newaxis] * nominal_speed
+		steps = nominal_vels * self._delta
+
+		# compute_cost takes a step for every multiple of the step length short of the segment length
+		step_ratio = lengths / (nominal_speed * self._delta)
+		num_steps = np.maximum(np.ceil(step_ratio).astype(np.intp) - 1, 0)
+
+		# compute_cost accumulates its position, so when a segment is a whole number of steps
+		# long rounding decides whether the last step is taken
+		whole = np.flatnonzero(nonzero & (np.abs(step_ratio - np.round(step_ratio)) < 1e-6))
+		num_steps[whole] = _accumulated_step_counts(starts[whole], steps[whole], lengths[whole],
+			np.round(step_ratio[whole]).astype(np.intp), self._chunk_size)
+		num_samples = num_steps + 1
+
+		costs = np.zeros(len(starts))
+		for start, stop in _chunk_bounds(num_samples, self._chunk_size):
+			counts = num_samples[start:stop]
+			seg = np.repeat(np.arange(start, stop), counts)
+			k = _ragged_arange(counts)
+
+			flow = self._flow_field.sample(starts[seg] + steps[seg] * k[:,np.newaxis])
+
+			# Consecutive samples form a step only when they belong to the same segment
+			in_segment = k[1:] > 0
+			step_seg = seg[1:][in_segment]
+			avg_vel = (flow[:-1][in_segment] + flow[1:][in_segment]) / 2.
+			step_costs = np.linalg.norm(nominal_vels[step_seg] - avg_vel, axis=1) * self._delta
+
+			costs[start:stop] = np.bincount(step_seg - start, weights=step_costs, minlength=stop-start)
+
+		return costs
+
+	@property
+	def flow_field(self):
+		return self._flow_field
+
+	@flow_field.setter
+	def flow_field(self, new_field):
+		self._flow_field = new_field
+
+	@property
+	def nominal_speed(self):
+		return self._nominal_speed
+
+	@nominal_speed.setter
+	def nominal_speed(self, new_speed):
+		self._nominal_speed = new_speed
+
 	"""
 	def compute_cost(self, start_point, end_point):
 		start = np.array(start_point)
@@ -100,6 +296,220 @@ class OpposingFlowEnergy(Heuristic):
 		return total_cost
 		"""
 
+
+class QuadratureFlowEnergy(OpposingFlowEnergy):
+	""" Computes the same energy integral as OpposingFlowEnergy using adaptive
+		 Gauss-Legendre quadrature over vectorized field samples instead of
+		 fixed time steps
+
+		 Refinement stops at panels narrower than min_width, after max_depth
+		 bisections or once a segment holds max_panels panels, whichever comes
+		 first, so discontinuities such as a segment grazing the field boundary
+		 cannot make the panel count grow without bound
+	"""
+
+	def __init__(self, flow_field, nominal_speed=0.5, tolerance=1e-6, order=8, max_depth=16, min_width=1e-3,
+						max_panels=1024, chunk_size=2**16):
+		self._flow_field = flow_field
+		self._nominal_speed = nominal_speed
+		self._tolerance = tolerance
+		self._max_depth = max_depth
+		self._min_width = min_width
+		self._max_panels = max_panels
+		self._chunk_size = chunk_size
+		self._nodes, self._weights = np.polynomial.legendre.leggauss(order)
+
+	def compute_cost(self, start_point, end_point, nominal_speed=None):
+		if nominal_speed is None:
+			nominal_speed = self._nominal_speed
+
+		starts = np.asarray(start_point, dtype=float).reshape(1, 2)
+		ends = np.asarray(end_point, dtype=float).reshape(1, 2)
+
+		return self._integrate(starts, ends, nominal_speed)[0]
+
+	def compute_costs(self, start_points, end_points, nominal_speed=None):
+		if nominal_speed is None:
+			nominal_speed = self._nominal_speed
+
+		starts, ends = _as_segments(start_points, end_points)
+		costs = np.empty(len(starts))
+
+		# Bound the number of panels sampled at once
+		for start in range(0, len(starts), self._chunk_size):
+			stop = start + self._chunk_size
+			costs[start:stop] = self._integrate(starts[start:stop], ends[start:stop], nominal_speed)
+
+		return costs
+
+	def _panel_estimates(self, starts, directions, nominal_vels, a, b):
+		# Gauss-Legendre estimate of integrand over arc length panels [a,b]
+		half_width = (b - a) / 2.
+		u = (a + half_width)[:,np.newaxis] + half_width[:,np.newaxis] * self._nodes
+		pts = starts[:,np.newaxis,:] + directions[:,np.newaxis,:] * u[:,:,np.newaxis]
+
+		flow = self._flow_field.sample(pts.reshape(-1, 2)).reshape(pts.shape)
+		integrand = np.linalg.norm(nominal_vels[:,np.newaxis,:] - flow, axis=2)
+
+		return half_width * (integrand @ self._weights)
+
+	def _integrate(self, starts, ends, nominal_speed):
+		""" Integrate boat effort along each of the segments from starts to ends
+
+			Each segment is split into panels which are bisected until the
+			refined estimate agrees with the coarse one to within the panel's
+			share of the tolerance. All active panels of all segments are
+			evaluated together with a single field sample per refinement level
+		"""
+		diff = ends - starts
+		lengths = np.linalg.norm(diff, axis=1)
+		costs = np.zeros(len(starts))
+
+		seg = np.flatnonzero(lengths > 0.)
+		directions = np.zeros_like(diff)
+		directions[seg] = diff[seg] / lengths[seg,np.newaxis]
+		nominal_vels = directions * nominal_speed
+
+		# Integrate over arc length, divide by speed at the end to get time integral
+		a = np.zeros(len(seg))
+		b = lengths[seg]
+		whole = self._panel_estimates(starts[seg], directions[seg], nominal_vels[seg], a, b)
+		tolerance = self._tolerance * nominal_speed
+
+		for depth in range(self._max_depth + 1):
+			if len(seg) == 0:
+				break
+
+			mid = (a + b) / 2.
+			halves = self._panel_estimates(np.tile(starts[seg], (2, 1)), np.tile(directions[seg], (2, 1)),
+				np.tile(nominal_vels[seg], (2, 1)), np.concatenate((a, mid)), np.concatenate((mid, b)))
+			left, right = np.split(halves, 2)
+			refined = left + right
+
+			accepted = np.abs(refined - whole) <= tolerance * (b - a) / lengths[seg]
+			accepted |= b - a < 2. * self._min_width
+			if depth == self._max_depth:
+				accepted[:] = True
+
+			# Segments whose split panels would exceed max_panels accept everything they have
+			panel_counts = np.bincount(seg, minlength=len(starts)) + np.bincount(seg[~accepted], minlength=len(starts))
+			accepted |= (panel_counts > self._max_panels)[seg]
+
+			np.add.at(costs, seg[accepted], refined[accepted])
+
+			split = ~accepted
+			seg = np.tile(seg[split], 2)
+			a, b = np.concatenate((a[split], mid[split])), np.concatenate((mid[split], b[split]))
+			whole = np.concatenate((left[split], right[split]))
+
+		return costs / nominal_speed
+
+
+CacheInfo = collections.namedtuple('CacheInfo', ['hits', 'misses', 'evictions', 'maxsize', 'currsize'])
+
+class CachedHeuristic(Heuristic):
+	""" Wraps any Heuristic and memoizes its edge costs in a bounded LRU cache
+
+		Points are quantized to multiples of tolerance to form cache keys.
+		The cache is bounded by max_entries and, optionally, by an estimate
+		of its memory use in bytes. It is cleared automatically whenever the
+		wrapped heuristic's flow_field or nominal_speed is replaced
+	"""
+
+	def __init__(self, heuristic, max_entries=2**20, max_bytes=None, tolerance=1e-6):
+		self._heuristic = heuristic
+		self._tolerance = tolerance
+		self._cache = collections.OrderedDict()
+
+		# Estimate memory held by one entry: key tuple, its ints, the cost and the dict node
+		sample_key = (2**40,) * 4
+		self._entry_bytes = sys.getsizeof(sample_key) + 4*sys.getsizeof(2**40) + sys.getsizeof(1.) + 100
+		self._maxsize = max_entries if max_bytes is None else min(max_entries, max_bytes // self._entry_bytes)
+
+		self._hits = 0
+		self._misses = 0
+		self._evictions = 0
+		self._heuristic_state = self._current_state()
+
+	def _current_state(self):
+		return (getattr(self._heuristic, 'flow_field', None), getattr(self._heuristic, 'nominal_speed', None))
+
+	def _check_state(self):
+		# Costs are only valid for the field and speed they were computed with
+		flow_field, nominal_speed = self._current_state()
+		if flow_field is not self._heuristic_state[0] or nominal_speed != self._heuristic_state[1]:
+			self.cache_clear()
+			self._heuristic_state = (flow_field, nominal_speed)
+
+	def _keys(self, starts, ends, kwargs):
+		quantized = np.round(np.hstack((starts, ends)) / self._tolerance).astype(np.int64)
+		extra = tuple(sorted(kwargs.items()))
+
+		return [(*k, *extra) for k in map(tuple, quantized.tolist())]
+
+	def _insert(self, key, cost):
+		self._cache[key] = cost
+		while len(self._cache) > self._maxsize:
+			self._cache.popitem(last=False)
+			self._evictions += 1
+
+	def compute_cost(self, start_point, end_point, **kwargs):
+		self._check_state()
+		starts, ends = _as_segments(start_point, end_point)
+		key = self._keys(starts, ends, kwargs)[0]
+
+		if key in self._cache:
+			self._hits += 1
+			self._cache.move_to_end(key)
+			return self._cache[key]
+
+		self._misses += 1
+		cost = self._heuristic.compute_cost(start_point, end_point, **kwargs)
+		self._insert(key, cost)
+
+		return cost
+
+	def compute_costs(self, start_points, end_points, **kwargs):
+		self._check_state()
+		starts, ends = _as_segments(start_points, end_points)
+		costs = np.empty(len(starts))
+
+		# Look up every edge, gathering the distinct missing edges for one batched call
+		missing = collections.OrderedDict()
+		for i, key in enumerate(self._keys(starts, ends, kwargs)):
+			if key in self._cache:
+				self._hits += 1
+				self._cache.move_to_end(key)
+				costs[i] = self._cache[key]
+			else:
+				self._misses += 1
+				missing.setdefault(key, []).append(i)
+
+		if missing:
+			first = [indices[0] for indices in missing.values()]
+			new_costs = self._heuristic.compute_costs(starts[first], ends[first], **kwargs)
+
+			for (key, indices), cost in zip(missing.items(), new_costs):
+				costs[indices] = cost
+				self._insert(key, float(cost))
+
+		return costs
+
+	def cache_info(self):
+		return CacheInfo(self._hits, self._misses, self._evictions, self._maxsize, len(self._cache))
+
+	def cache_clear(self):
+		self._cache.clear()
+
+	@property
+	def heuristic(self):
+		return self._heuristic
+
+	@property
+	def memory_usage(self):
+		""" Estimated bytes held by cache entries """
+		return len(self._cache) * self._entry_bytes
+
 # class FlowIntegral(Heuristic):
 
 # 	def __init__(self, flow_field, nominal_speed=0.5, delta=0.01):
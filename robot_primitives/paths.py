@@ -1,6 +1,11 @@
 import numpy as np
+import shapely
+import numbers
 import json
+import mmap
 import os
+import time
+import zlib
 
 from .base import Path
 
@@ -8,7 +13,8 @@ from .base import Path
 class PathJSONEncoder(json.JSONEncoder):
 
 	def default(self, data):
-		dict_rep = {'coord_list':data.coord_list, **data.constraints}
+		# Masked (undefined) constraint values are written as null
+		dict_rep = {'coord_list':data.coords.tolist(), **{k:v.tolist() for k,v in data.constraints.items()}}
 		return dict_rep
 
 	@classmethod
@@ -18,120 +24,752 @@ class PathJSONEncoder(json.JSONEncoder):
 		path = ConstrainedPath(coord_list, **json_dict)
 		return path
 
+class PathBinaryFormat:
+	""" Compact binary path format: a magic string, the length of a JSON header
+		 describing every array, then the raw arrays at 64 byte aligned offsets.
+		 Numeric constraints are stored as raw values plus validity masks, other
+		 constraints are kept in the header as JSON, so their values must be JSON
+		 native (strings, numbers, booleans, None, lists and string keyed dicts)
+		 or writing raises ValueError. Files are memory mapped on load so
+		 opening a path reads nothing but the header until data is accessed
+	"""
+
+	extension = 'rpath'
+	magic = b'RPPATH01'
+	alignment = 64
+
+	@classmethod
+	def write(cls, path, filename):
+		arrays = {'coords':path.coords, 'cumulative_length':path.cumulative_length}
+		object_constraints = {}
+
+		for param, column in path.constraints.items():
+			if column.dtype == object:
+				object_constraints[param] = _json_native_values(param, column)
+			else:
+				arrays[f'constraint/{param}'] = np.ma.getdata(column)
+				arrays[f'valid/{param}'] = ~np.ma.getmaskarray(column)
+
+		# Lay out arrays after the header, which is padded to a generous fixed size estimate
+		descriptions = {name:{'dtype':a.dtype.str, 'shape':a.shape} for name, a in arrays.items()}
+		header = {'size':path.size, 'arrays':descriptions, 'object_constraints':object_constraints}
+		offset = cls._align(len(cls.magic) + 8 + len(json.dumps(header)) + 32 * len(arrays) + 64)
+		for name, a in arrays.items():
+			descriptions[name]['offset'] = offset
+			offset = cls._align(offset + a.nbytes)
+
+		header_bytes = json.dumps(header).encode('utf-8')
+
+		# Write beside the target and swap it in, the path may be memory mapped from the target itself
+		directory, basename = os.path.split(os.path.abspath(filename))
+		temp_filename = os.path.join(directory, f".{basename}.{os.getpid()}.tmp")
+		try:
+			with open(temp_filename, 'wb') as f:
+				f.write(cls.magic)
+				f.write(np.uint64(len(header_bytes)).tobytes())
+				f.write(header_bytes)
+				for name, a in arrays.items():
+					f.seek(descriptions[name]['offset'])
+					np.ascontiguousarray(a).tofile(f)
+				f.truncate(offset)
+
+			os.replace(temp_filename, filename)
+		finally:
+			if os.path.exists(temp_filename):
+				os.remove(temp_filename)
+
+	@classmethod
+	def read(cls, filename):
+		with open(filename, 'rb') as f:
+			if f.read(len(cls.magic)) != cls.magic:
+				raise ValueError(f"{filename} is not a binary path file")
+			header_len = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+			header = json.loads(f.read(header_len).decode('utf-8'))
+
+		size = header['size']
+
+		# Copy on write maps let the path be modified in memory without touching the file
+		arrays = {}
+		for name, d in header['arrays'].items():
+			shape = tuple(d['shape'])
+			if size == 0:
+				arrays[name] = np.zeros(shape, dtype=d['dtype'])
+			else:
+				arrays[name] = np.memmap(filename, dtype=d['dtype'], mode='c', offset=d['offset'], shape=shape)
+
+		columns = {}
+		for name in arrays.keys():
+			if name.startswith('constraint/'):
+				param = name[len('constraint/'):]
+				columns[param] = (arrays[name], arrays[f'valid/{param}'])
+
+		for param, values in header['object_constraints'].items():
+			columns[param] = _constraint_column(values, size)
+
+		return ConstrainedPath._from_columns(arrays['coords'], columns, arrays['cumulative_length'])
+
+	@classmethod
+	def _align(cls, offset):
+		return -(-offset // cls.alignment) * cls.alignment
+
+def _json_native_values(param, column):
+	""" Values of an object constraint as a list, checking it comes back unchanged from JSON """
+	values = column.tolist()
+	try:
+		unchanged = json.loads(json.dumps(values)) == values
+	except (TypeError, ValueError):
+		unchanged = False
+
+	if not unchanged:
+		raise ValueError(f"Values of constraint {param} are not JSON native, binary paths can only store strings, "
+			"numbers, booleans, None, lists and string keyed dicts in non numeric constraints")
+
+	return values
+
+def _object_array(values):
+	array = np.empty(len(values), dtype=object)
+	for i, v in enumerate(values):
+		array[i] = v
+
+	return array
+
+def _constraint_column(values, size):
+	""" Convert constraint values into a typed array and validity mask of length size
+
+		 Values may be a masked array, an ndarray or a sequence using None for
+		 undefined values. Numeric and boolean values are stored in a typed array,
+		 anything else in an object array
+	"""
+	if isinstance(values, np.ma.MaskedArray):
+		data = np.ma.getdata(values)
+		valid = ~np.ma.getmaskarray(values)
+	elif isinstance(values, np.ndarray) and values.dtype != object:
+		data = values
+		valid = np.ones(len(values), dtype=bool)
+	else:
+		values = list(values)
+		valid = np.array([v is not None for v in values], dtype=bool)
+		defined = [v for v in values if v is not None]
+
+		if all(isinstance(v, (numbers.Real, np.bool_)) for v in defined):
+			dtype = np.asarray(defined).dtype if defined else float
+			data = np.zeros(len(values), dtype=dtype)
+			data[valid] = defined
+		else:
+			data = _object_array(values)
+
+	if data.ndim != 1 or data.dtype.kind not in 'biufO':
+		data = _object_array(data)
+
+	# Pad short constraint lists with undefined values, as add_point does for missing constraints
+	column = np.zeros(size, dtype=data.dtype)
+	mask = np.zeros(size, dtype=bool)
+	count = min(size, len(data))
+	column[:count] = data[:count]
+	mask[:count] = valid[:count]
+
+	return column, mask
+
+def _aggregate_spans(values, valid, starts, mode):
+	""" Reduce the defined values in each span starting at starts, spans with no defined values are undefined """
+	counts = np.add.reduceat(valid.astype(int), starts)
+	if mode == 'mean':
+		totals = np.add.reduceat(np.where(valid, values, 0), starts, dtype=float)
+		with np.errstate(invalid='ignore', divide='ignore'):
+			aggregate = totals / counts
+	else:
+		# Undefined entries are filled with a value that never wins the reduction
+		fill = values.max() if mode == 'min' else values.min()
+		reduce = np.minimum if mode == 'min' else np.maximum
+		aggregate = reduce.reduceat(np.where(valid, values, fill), starts)
+
+	return aggregate, counts > 0
+
+def _value_dtype(value):
+	return np.asarray(value).dtype if isinstance(value, (numbers.Real, np.bool_)) else np.dtype(object)
+
+def _douglas_peucker(coords, tolerance):
+	""" Mask of points retained by Douglas-Peucker, run by GEOS through shapely.simplify.
+		 GEOS measures distances in x and y only and keeps z, so the index of each point
+		 is carried through as its z coordinate
+	"""
+	line = shapely.linestrings(np.column_stack((coords, np.arange(len(coords)))))
+	simplified = shapely.simplify(line, tolerance, preserve_topology=False)
+
+	keep = np.zeros(len(coords), dtype=bool)
+	keep[shapely.get_coordinates(simplified, include_z=True)[:,2].astype(np.intp)] = True
+	keep[[0, -1]] = True
+	return keep
+
+def _triangle_areas(a, b, c):
+	return 0.5 * np.abs((b[:,0] - a[:,0]) * (c[:,1] - a[:,1]) - (c[:,0] - a[:,0]) * (b[:,1] - a[:,1]))
+
+def _visvalingam(coords, tolerance):
+	""" Mask of points retained by Visvalingam-Whyatt with an area tolerance.
+
+		 Each round removes every point whose triangle area is below tolerance and a
+		 strict local minimum, ties broken by index. Runs of further points below
+		 tolerance whose areas are within a factor of two of their neighbours' are
+		 thinned to every other point in the same round, so plateaus and slowly
+		 varying areas, as on straight or evenly sampled paths, take a logarithmic
+		 rather than linear number of rounds. No two neighbours are removed together.
+		 Remaining points are linked to their neighbours so each round only visits
+		 points below tolerance
+	"""
+	n = len(coords)
+	preceding, following = np.arange(-1, n - 1), np.arange(1, n + 1)
+	areas = np.full(n, np.inf)
+	areas[1:-1] = _triangle_areas(coords[:-2], coords[1:-1], coords[2:])
+
+	keep = np.ones(n, dtype=bool)
+	is_candidate = areas < tolerance
+	candidates = np.flatnonzero(is_candidate)
+	while len(candidates) > 0:
+		area, prev_area, next_area = areas[candidates], areas[preceding[candidates]], areas[following[candidates]]
+		minima = (area <= prev_area) & (area < next_area)
+
+		# Whether each candidate directly follows the one before it along the path
+		follows = np.concatenate(([False], preceding[candidates[1:]] == candidates[:-1]))
+		follows_next = np.append(follows[1:], False)
+
+		# Near minima not beside a removed minimum, thinned by position along each run of them
+		near_minima = (area <= 2. * prev_area) & (area <= 2. * next_area) & ~minima
+		near_minima[1:] &= ~(follows[1:] & minima[:-1])
+		near_minima[:-1] &= ~(follows_next[:-1] & minima[1:])
+		positions = np.arange(len(candidates))
+		run_start = near_minima & ~(follows & np.concatenate(([False], near_minima[:-1])))
+		run_starts = np.maximum.accumulate(np.where(run_start, positions, 0))
+
+		remove = minima | (near_minima & ((positions - run_starts) % 2 == 0))
+		if not remove.any():
+			break
+
+		# Unlink removed points and recompute the areas of their neighbours
+		removed = candidates[remove]
+		removed_prev, removed_next = preceding[removed], following[removed]
+		following[removed_prev] = removed_next
+		preceding[removed_next] = removed_prev
+		keep[removed] = False
+
+		affected = np.concatenate((removed_prev, removed_next))
+		affected = affected[(affected > 0) & (affected < n - 1)]
+		areas[affected] = _triangle_areas(coords[preceding[affected]], coords[affected], coords[following[affected]])
+
+		# Candidates stay in path order by marking them over all points
+		is_candidate[removed] = False
+		is_candidate[affected] = areas[affected] < tolerance
+		candidates = np.flatnonzero(is_candidate)
+
+	return keep
+
 class ConstrainedPath(Path):
+	""" Path stored column-wise: coordinates in a growable (N,2) float64 buffer
+		 and each constraint in a typed buffer with a validity mask, along with a
+		 lazily computed cumulative length array
+	"""
 
 	json_encoder = PathJSONEncoder
 
 	def __init__(self, coord_list, **constraints):
-		self._coord_list = coord_list
-		self._constraints = constraints
+		coords = np.array(coord_list, dtype=float).reshape(-1, 2)
+		self._size = len(coords)
+		self._coords = coords
+		self._constraints = {}
+		self._valid = {}
+
+		# Cumulative length is computed lazily and extended incrementally as points are added
+		self._cumulative_length = np.zeros(self._size)
+		self._measured = 0
+		self._segment_index = None
+
+		for param, values in constraints.items():
+			self._constraints[param], self._valid[param] = _constraint_column(values, self._size)
+			setattr(ConstrainedPath, param, self._property_factory(param))
 
-		# Compute euclidean path length
-		self._compute_length()
+	@classmethod
+	def from_stream(cls, filename):
+		""" Assemble a full path from a file written by PathStreamWriter """
+		path = cls([])
+		for coords, constraints in read_path_stream(filename):
+			path += cls(coords, **constraints)
 
-		for param in self._constraints.keys():
-			setattr(ConstrainedPath, param, self._property_factory(param))
+		return path
+
+	@classmethod
+	def _from_columns(cls, coords, columns, cumulative_length=None):
+		""" Build a path directly around existing buffers without copying them """
+		path = cls.__new__(cls)
+		path._size = len(coords)
+		path._coords = coords
+		path._constraints = {k:v[0] for k,v in columns.items()}
+		path._valid = {k:v[1] for k,v in columns.items()}
+		path._segment_index = None
+
+		if cumulative_length is None:
+			path._cumulative_length = np.zeros(path._size)
+			path._measured = 0
+		else:
+			path._cumulative_length = cumulative_length
+			path._measured = path._size
+
+		for param in columns.keys():
+			setattr(ConstrainedPath, param, path._property_factory(param))
+
+		return path
 
 	def __getitem__(self, index):
-		if index < len(self._coord_list):
-			return self._coord_list[index]
+		if isinstance(index, slice):
+			sliced = ConstrainedPath(self.coords[index])
+			for param in self._constraints:
+				sliced._set_column(param, self._constraints[param][:self._size][index], self._valid[param][:self._size][index])
+			return sliced
+
+		if index < self._size:
+			return tuple(self.coords[index].tolist())
 		else:
 			return None
 
 	def __iadd__(self, other):
-		other_constraints = set(other.constrained_parameters)
-		other_constraints.difference_update(self._constraints.keys())
+		start = self._size
+		end = start + other.size
+		self._reserve(end)
+
+		# Add newly constrained params, undefined for path up to now
+		for new_param in set(other.constrained_parameters).difference(self._constraints.keys()):
+			column = other.constraints[new_param]
+			self._set_column(new_param, np.zeros(len(self._coords), dtype=column.dtype), np.zeros(len(self._coords), dtype=bool))
+			setattr(ConstrainedPath, new_param, self._property_factory(new_param))
 
-		# Update existing constrained params
+		# Update constrained params, undefined where other path is unconstrained
 		for param in self._constraints.keys():
 			if other.is_constrained(param):
-				self._constraints[param].extend(getattr(other, param))
+				column = other.constraints[param]
+				self._ensure_dtype(param, column.dtype)
+				self._constraints[param][start:end] = np.ma.getdata(column)
+				self._valid[param][start:end] = ~np.ma.getmaskarray(column)
 			else:
-				self._constraints[param].extend([None]*other.size)
+				self._valid[param][start:end] = False
 
-		# Add newly constrained params, us None for path up to now
-		for new_param in other_constraints:
-			self._constraints[new_param] = [None]*self.size
-			self._constraints[new_param].extend(getattr(other, new_param))
-
-		# Add coords of other path to this path and update length
-		self._coord_list.extend(other.coord_list)
-		self._compute_length()
+		# Add coords of other path to this path, length is extended lazily
+		self._coords[start:end] = other.coords
+		self._size = end
+		self._segment_index = None
 
 		return self
 
 	@classmethod
 	def from_file(cls, filename):
 		extension = os.path.splitext(filename)[1][1:]
+		if extension == PathBinaryFormat.extension:
+			return PathBinaryFormat.read(filename)
+
 		with open(filename, mode='r') as f:
 			if extension == 'json':
 				path = json.load(f, object_hook=PathJSONEncoder.decode)
 			else:
-				print(f"Error: Unrecognized extension {extension}, supported extension is json")
+				print(f"Error: Unrecognized extension {extension}, supported extensions are json and {PathBinaryFormat.extension}")
 				path = None
 
 		return path
 
 	def save(self, filename):
 		extension = os.path.splitext(filename)[1][1:]
+		if extension == PathBinaryFormat.extension:
+			PathBinaryFormat.write(self, filename)
+			return
+
 		with open(filename, 'w') as f:
 			if extension == 'json':
 				json.dump(self, f, cls=ConstrainedPath.json_encoder, indent=2)
 			else:
-				print(f"Error: Unrecognized extension {extension}, supported extension is json")
+				print(f"Error: Unrecognized extension {extension}, supported extensions are json and {PathBinaryFormat.extension}")
 
 
 	def _property_factory(self, parameter):
-		return property(lambda obj:obj._constraints[parameter], 
-							lambda obj, val: obj._constraints.update({parameter:value}), 
-							lambda obj:obj._constraints.pop(parameter))
+		return property(lambda obj:obj.constraints[parameter],
+							lambda obj, val: obj._set_column(parameter, *_constraint_column(val, obj._size)),
+							lambda obj:obj._remove_column(parameter))
+
+	def _set_column(self, parameter, values, valid):
+		# Keep constraint buffers as long as the coordinate buffer
+		column = np.zeros(len(self._coords), dtype=values.dtype)
+		mask = np.zeros(len(self._coords), dtype=bool)
+		column[:self._size] = values[:self._size]
+		mask[:self._size] = valid[:self._size]
+
+		self._constraints[parameter] = column
+		self._valid[parameter] = mask
+
+	def _remove_column(self, parameter):
+		self._constraints.pop(parameter)
+		self._valid.pop(parameter)
+
+	def _ensure_dtype(self, parameter, dtype):
+		# Upcast column when values of a wider type are added, e.g. floats to an int column
+		column = self._constraints[parameter]
+		new_dtype = np.dtype(object) if object in (column.dtype, dtype) else np.result_type(column.dtype, dtype)
+		if new_dtype != column.dtype:
+			self._constraints[parameter] = column.astype(new_dtype)
+
+	def _reserve(self, capacity):
+		""" Grow buffers geometrically so appends are amortized O(1) """
+		if capacity <= len(self._coords):
+			return
+
+		new_capacity = max(capacity, 2 * len(self._coords), 16)
+
+		coords = np.empty((new_capacity, 2), dtype=float)
+		coords[:self._size] = self._coords[:self._size]
+		self._coords = coords
+
+		cumulative_length = np.zeros(new_capacity)
+		cumulative_length[:self._measured] = self._cumulative_length[:self._measured]
+		self._cumulative_length = cumulative_length
+
+		for param in self._constraints.keys():
+			column = np.zeros(new_capacity, dtype=self._constraints[param].dtype)
+			column[:self._size] = self._constraints[param][:self._size]
+			mask = np.zeros(new_capacity, dtype=bool)
+			mask[:self._size] = self._valid[param][:self._size]
+			self._constraints[param] = column
+			self._valid[param] = mask
 
 	def _compute_length(self):
-		self._length = 0.
-		for u, v in zip(self._coord_list, self._coord_list[1:]):
-			self._length += np.linalg.norm(np.asarray(v) - np.asarray(u))
+		# Only measure points added since the last time length was needed
+		start = max(self._measured, 1)
+		if start < self._size:
+			segment_lengths = np.linalg.norm(self._coords[start:self._size] - self._coords[start-1:self._size-1], axis=1)
+			self._cumulative_length[start:self._size] = self._cumulative_length[start-1] + np.cumsum(segment_lengths)
+
+		self._measured = self._size
+
+	def transform(self, transform_func, vectorized=False):
+		""" Apply transform_func to every point, or to the whole (N,2) coordinate array if vectorized """
+		if vectorized:
+			new_coords = np.asarray(transform_func(self.coords.copy()), dtype=float).reshape(-1, 2)
+		else:
+			new_coords = np.array([transform_func(pt) for pt in self.coord_list], dtype=float).reshape(-1, 2)
 
-	def transform(self, transform_func):
-		self._coord_list = [transform_func(pt) for pt in self._coord_list]
-		self._compute_length()
+		self._coords[:self._size] = new_coords
+		self._measured = 0
+		self._segment_index = None
 
 	def is_constrained(self, parameter):
 		return parameter in self._constraints
 
 	def add_point(self, point, **constraints):
-		self._length += np.linalg.norm(np.asarray(point) - np.asarray(self._coord_list[-1]))
-		self._coord_list.append(tuple(point))
+		index = self._size
+		self._reserve(index + 1)
+		self._coords[index] = point
+
+		# Constraints not seen before are undefined for the path up to now
+		for k in set(constraints.keys()).difference(self._constraints.keys()):
+			self._set_column(k, np.zeros(len(self._coords), dtype=_value_dtype(constraints[k])), np.zeros(len(self._coords), dtype=bool))
+			setattr(ConstrainedPath, k, self._property_factory(k))
+
+		for k in self._constraints.keys():
+			value = constraints.get(k)
+			if value is None:
+				self._valid[k][index] = False
+			else:
+				self._ensure_dtype(k, _value_dtype(value))
+				self._constraints[k][index] = value
+				self._valid[k][index] = True
+
+		self._size += 1
+		self._segment_index = None
+
+	def reverse(self):
+		n = self._size
+		self._coords[:n] = self._coords[:n][::-1]
 
-		new_keys = set(constraints.keys())
-		existing_keys = set(self._constraints.keys())
+		for key in self._constraints.keys():
+			self._constraints[key][:n] = self._constraints[key][:n][::-1]
+			self._valid[key][:n] = self._valid[key][:n][::-1]
 
-		undefined_keys = existing_keys.difference(new_keys)
+		if self._measured == n and n > 0:
+			self._cumulative_length[:n] = self._cumulative_length[n-1] - self._cumulative_length[:n][::-1]
+		else:
+			self._measured = 0
 
-		for k in new_keys:
-			self._constraints[k].append(constraints[k])
+		self._segment_index = None
 
-		for k in undefined_keys:
-			self._constraints[k].append(None)
+	def position_at(self, s):
+		""" Point at arc length s along the path, s is clamped to [0, length] """
+		if self._size == 0:
+			return None
 
-	def reverse(self):
-		self._coord_list.reverse()
+		return tuple(self.positions_at([s])[0].tolist())
+
+	def positions_at(self, s_values):
+		""" (M,2) array of points at each arc length in s_values """
+		s_values = np.asarray(s_values, dtype=float).reshape(-1)
+		coords = self.coords
+		if self._size < 2:
+			return np.repeat(coords[:1], len(s_values), axis=0)
+
+		cumulative_length = self.cumulative_length
+		s_values = np.clip(s_values, 0., cumulative_length[-1])
+
+		# Segment containing each s, found by binary search on the cumulative length
+		index = np.clip(np.searchsorted(cumulative_length, s_values, side='right') - 1, 0, self._size - 2)
+		segment_lengths = cumulative_length[index+1] - cumulative_length[index]
+		with np.errstate(invalid='ignore', divide='ignore'):
+			t = np.where(segment_lengths > 0, (s_values - cumulative_length[index]) / segment_lengths, 0.)
+
+		return coords[index] + t[:,None] * (coords[index+1] - coords[index])
+
+	def resample(self, spacing):
+		""" New path with points spaced uniformly by spacing along this path, ending at the last point.
+			 Constraints take the value of the path point preceding each new point
+		"""
+		length = self.length
+		if self._size < 2 or length == 0:
+			return self[:1]
+
+		s_values = np.arange(0., length, spacing)
+		if length - s_values[-1] > 1e-9 * length:
+			s_values = np.append(s_values, length)
+		else:
+			s_values[-1] = length
 
-		for key in self._constraints.keys():
-			self._constraints[key].reverse()
+		resampled = ConstrainedPath(self.positions_at(s_values))
+		index = np.clip(np.searchsorted(self.cumulative_length, s_values, side='right') - 1, 0, self._size - 1)
+		for param in self._constraints:
+			resampled._set_column(param, self._constraints[param][:self._size][index], self._valid[param][:self._size][index])
+			setattr(ConstrainedPath, param, resampled._property_factory(param))
+
+		return resampled
+
+	def nearest_point(self, point):
+		""" Closest point on the path to point and its arc length along the path """
+		if self._size == 0:
+			return None
+
+		nearest, s_values = self.nearest_points([point])
+		return tuple(nearest[0].tolist()), s_values[0]
+
+	def nearest_points(self, points):
+		""" Closest points on the path, (M,2), and their arc lengths, (M,), for an (M,2) array of points """
+		points = np.asarray(points, dtype=float).reshape(-1, 2)
+		coords = self.coords
+		cumulative_length = self.cumulative_length
+		if self._size < 2:
+			return np.repeat(coords[:1], len(points), axis=0), np.zeros(len(points))
+
+		# Spatial index of path segments is built once per path modification
+		if self._segment_index is None:
+			self._segment_index = shapely.STRtree(shapely.linestrings(np.stack((coords[:-1], coords[1:]), axis=1)))
+
+		query_index, index = self._segment_index.query_nearest(shapely.points(points), all_matches=False)
+		index = index[np.argsort(query_index)]
+
+		# Project onto the nearest segment
+		starts = coords[index]
+		segments = coords[index+1] - starts
+		squared_lengths = np.einsum('ij,ij->i', segments, segments)
+		with np.errstate(invalid='ignore', divide='ignore'):
+			t = np.einsum('ij,ij->i', points - starts, segments) / squared_lengths
+		t = np.clip(np.nan_to_num(t, nan=0.), 0., 1.)
+
+		nearest = starts + t[:,None] * segments
+		return nearest, cumulative_length[index] + t * np.sqrt(squared_lengths)
+
+	def simplify(self, tolerance, method='douglas-peucker', constraint_mode='keep'):
+		""" New path with fewer points, method is 'douglas-peucker' with a distance tolerance or
+			 'visvalingam' with an area tolerance. With constraint_mode 'keep' retained points keep
+			 their constraint values, with 'mean', 'min' or 'max' each retained point takes the
+			 aggregate of the defined values from itself up to the next retained point
+		"""
+		if self._size < 3:
+			return self[:]
+
+		if method == 'douglas-peucker':
+			keep = _douglas_peucker(self.coords, tolerance)
+		elif method == 'visvalingam':
+			keep = _visvalingam(self.coords, tolerance)
+		else:
+			raise ValueError(f"Unknown simplification method {method}, supported methods are douglas-peucker and visvalingam")
+
+		if constraint_mode not in ('keep', 'mean', 'min', 'max'):
+			raise ValueError(f"Unknown constraint mode {constraint_mode}, supported modes are keep, mean, min and max")
+
+		retained = np.flatnonzero(keep)
+		simplified = ConstrainedPath(self.coords[retained])
+		for param in self._constraints:
+			values = self._constraints[param][:self._size]
+			valid = self._valid[param][:self._size]
+			if constraint_mode == 'keep' or values.dtype == object:
+				new_values, new_valid = values[retained], valid[retained]
+			else:
+				new_values, new_valid = _aggregate_spans(values, valid, retained, constraint_mode)
+
+			simplified._set_column(param, new_values, new_valid)
+			setattr(ConstrainedPath, param, simplified._property_factory(param))
+
+		return simplified
+
+	@property
+	def coord_list(self):
+		return [tuple(pt) for pt in self.coords.tolist()]
+
+	@property
+	def coords(self):
+		""" Read only (N,2) view of path coordinates """
+		coords = self._coords[:self._size]
+		coords.flags.writeable = False
+		return coords
+
+	@property
+	def cumulative_length(self):
+		""" Path length from the first point up to each point """
+		if self._measured < self._size:
+			self._compute_length()
+
+		cumulative_length = self._cumulative_length[:self._size]
+		cumulative_length.flags.writeable = False
+		return cumulative_length
 
 	@property
 	def size(self):
-		return len(self._coord_list)
-	
+		return self._size
+
 	@property
 	def length(self):
-		return self._length
-	
+		return self.cumulative_length[-1] if self._size > 0 else 0.
+
 	@property
 	def constrained_parameters(self):
 		return self._constraints.keys()
-	
+
 	@property
 	def constraints(self):
-		return self._constraints
-	
\ No newline at end of file
+		""" Constraint values as masked arrays, masked where a value is undefined """
+		return {k:np.ma.MaskedArray(v[:self._size], mask=~self._valid[k][:self._size]) for k,v in self._constraints.items()}
+
+
+_FRAME_MAGIC = b'RPSF'
+_FRAME_HEADER = np.dtype([('magic', 'S4'), ('length', '<u4'), ('crc', '<u4')])
+
+class PathStreamWriter:
+	""" Append-only writer recording path points and constraints as they arrive
+
+		 Points are buffered and written in frames of up to chunk_size points.
+		 Each frame carries its length and a crc32 of its payload, so a reader can
+		 detect and skip a frame torn by a crash. Once fsync_interval seconds have
+		 passed since the last fsync, the next point added writes out the partial
+		 frame and fsyncs, so slow streams are not held in memory. The file is
+		 always fsynced on sync and close. Non numeric constraints must be JSON
+		 native, as in PathBinaryFormat
+	"""
+
+	def __init__(self, filename, chunk_size=256, fsync_interval=5.0):
+		self._file = open(filename, 'ab')
+		self._chunk_size = chunk_size
+		self._fsync_interval = fsync_interval
+		self._last_sync = time.monotonic()
+		self._chunk = ConstrainedPath([])
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def add_point(self, point, **constraints):
+		self._chunk.add_point(point, **constraints)
+		if self._chunk.size >= self._chunk_size or time.monotonic() - self._last_sync >= self._fsync_interval:
+			self.flush()
+
+	def flush(self):
+		""" Write buffered points as a frame, fsyncing if the sync interval has elapsed """
+		if self._chunk.size > 0:
+			self._write_frame(self._chunk)
+			self._chunk = ConstrainedPath([])
+
+		self._file.flush()
+		if time.monotonic() - self._last_sync >= self._fsync_interval:
+			self._sync_file()
+
+	def sync(self):
+		self.flush()
+		self._sync_file()
+
+	def close(self):
+		if not self._file.closed:
+			self.sync()
+			self._file.close()
+
+	def _sync_file(self):
+		os.fsync(self._file.fileno())
+		self._last_sync = time.monotonic()
+
+	def _write_frame(self, chunk):
+		arrays = [chunk.coords]
+		columns = {}
+		object_constraints = {}
+		for param, column in chunk.constraints.items():
+			if column.dtype == object:
+				object_constraints[param] = _json_native_values(param, column)
+			else:
+				columns[param] = column.dtype.str
+				arrays.extend((np.ma.getdata(column), ~np.ma.getmaskarray(column)))
+
+		header = json.dumps({'size':chunk.size, 'columns':columns, 'object_constraints':object_constraints}).encode('utf-8')
+		payload = b''.join([np.uint32(len(header)).tobytes(), header] + [np.ascontiguousarray(a).tobytes() for a in arrays])
+
+		frame = np.array([(_FRAME_MAGIC, len(payload), zlib.crc32(payload))], dtype=_FRAME_HEADER)
+		self._file.write(frame.tobytes() + payload)
+
+def read_path_stream(filename):
+	""" Generator over the frames of a file written by PathStreamWriter
+
+		 Yields (coords, constraints) tuples holding an (N,2) coordinate array and a
+		 dict of masked constraint arrays per frame. The file is memory mapped and
+		 read one frame at a time. Torn or corrupt frames are skipped by scanning
+		 ahead to the next frame marker
+	"""
+	if os.path.getsize(filename) == 0:
+		return
+
+	with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+		position = 0
+		while position + _FRAME_HEADER.itemsize <= len(data):
+			start = position + _FRAME_HEADER.itemsize
+			frame = np.frombuffer(data[position:start], dtype=_FRAME_HEADER)[0]
+			end = start + int(frame['length'])
+
+			if frame['magic'] != _FRAME_MAGIC or end > len(data) or zlib.crc32(data[start:end]) != frame['crc']:
+				position = data.find(_FRAME_MAGIC, position + 1)
+				if position < 0:
+					break
+				continue
+
+			yield _decode_frame(data[start:end])
+			position = end
+
+def _decode_frame(payload):
+	header_len = int(np.frombuffer(payload, dtype=np.uint32, count=1)[0])
+	header = json.loads(payload[4:4+header_len].decode('utf-8'))
+	size = header['size']
+
+	offset = 4 + header_len
+	coords = np.frombuffer(payload, dtype=float, count=2*size, offset=offset).reshape(size, 2)
+	offset += coords.nbytes
+
+	constraints = {}
+	for param, dtype in header['columns'].items():
+		values = np.frombuffer(payload, dtype=dtype, count=size, offset=offset)
+		offset += values.nbytes
+		valid = np.frombuffer(payload, dtype=bool, count=size, offset=offset)
+		offset += valid.nbytes
+		constraints[param] = np.ma.MaskedArray(values, mask=~valid)
+
+	for param, values in header['object_constraints'].items():
+		constraints[param] = _masked_column(values, size)
+
+	return coords, constraints
+
+def _masked_column(values, size):
+	column, valid = _constraint_column(values, size)
+	return np.ma.MaskedArray(column, mask=~valid)
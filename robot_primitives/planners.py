@@ -0,0 +1,157 @@
+import heapq
+import numpy as np
+
+from .heuristics import EuclideanDistance, CachedHeuristic
+from .paths import ConstrainedPath
+
+class GraphPlanner:
+	""" A* search over a Roadmap, such as Domain.visibility_graph or Domain.grid_graph
+
+		 Edge costs come from cost_heuristic, or from the roadmap edge weights when it is
+		 None, and the remaining cost to the goal is estimated with estimate_heuristic,
+		 which must not overestimate for the plan to be optimal. Without an estimate the
+		 search is Dijkstra's algorithm. By default the Euclidean distance is used when
+		 edge costs are lengths and no estimate otherwise, since costs such as flow energy
+		 can fall below the distance travelled. All outgoing edges of an expanded node are
+		 costed and estimated in one compute_costs call each.
+
+		 When a domain is given, start and goal points off the roadmap are joined to every
+		 roadmap node visible from them, otherwise they are snapped to the nearest node
+	"""
+
+	def __init__(self, roadmap, cost_heuristic=None, estimate_heuristic='auto', domain=None):
+		if estimate_heuristic == 'auto':
+			estimate_heuristic = EuclideanDistance() if _is_distance(cost_heuristic) else None
+
+		self._roadmap = roadmap
+		self._cost_heuristic = cost_heuristic
+		self._estimate_heuristic = estimate_heuristic
+		self._domain = domain
+
+	@classmethod
+	def from_domain(cls, domain, resolution=None, vehicle_radius=None, **kwargs):
+		""" Planner over the visibility graph of domain, or over its grid graph when a resolution is given """
+		if resolution is None:
+			roadmap = domain.visibility_graph(vehicle_radius)
+		else:
+			roadmap = domain.grid_graph(resolution, vehicle_radius)
+
+		return cls(roadmap, domain=domain, **kwargs)
+
+	def plan(self, start, goal):
+		""" Least cost path from start to goal, each a roadmap node index or a point.
+			 Returns a ConstrainedPath with the cost accumulated up to each point in a
+			 cost constraint, or None when the goal cannot be reached
+		"""
+		nodes = self._roadmap.nodes
+		num_nodes = len(nodes)
+
+		# Points are added as extra nodes after the roadmap nodes, joined to the nodes they see
+		start_node, start_point, start_links = self._attach(start, num_nodes)
+		goal_node, goal_point, goal_links = self._attach(goal, num_nodes + 1)
+		all_nodes = np.vstack((nodes, start_point, goal_point))
+
+		goal_linked = np.zeros(num_nodes + 2, dtype=bool)
+		goal_linked[goal_links] = True
+		if start_node == num_nodes and goal_node == num_nodes + 1 and self._domain is not None:
+			goal_linked[start_node] = self._domain.visible_points(start_point, goal_point[np.newaxis])[0]
+
+		g = np.full(num_nodes + 2, np.inf)
+		estimates = np.full(num_nodes + 2, np.nan)
+		parents = np.full(num_nodes + 2, -1, dtype=np.intp)
+		closed = np.zeros(num_nodes + 2, dtype=bool)
+
+		g[start_node] = 0.
+		open_list = [(self._estimate(all_nodes, np.array([start_node]), goal_point, estimates)[0], start_node)]
+
+		while open_list:
+			_, node = heapq.heappop(open_list)
+			if closed[node]:
+				continue
+			if node == goal_node:
+				break
+			closed[node] = True
+
+			neighbors, weights = self._successors(all_nodes, node, start_links, goal_node, goal_linked[node])
+			unexpanded = ~closed[neighbors]
+			neighbors, weights = neighbors[unexpanded], weights[unexpanded]
+			if len(neighbors) == 0:
+				continue
+
+			if self._cost_heuristic is None:
+				costs = weights
+			else:
+				costs = self._cost_heuristic.compute_costs(np.broadcast_to(all_nodes[node], (len(neighbors), 2)), all_nodes[neighbors])
+
+			candidates = g[node] + costs
+			better = candidates < g[neighbors]
+			neighbors, candidates = neighbors[better], candidates[better]
+			if len(neighbors) == 0:
+				continue
+
+			g[neighbors] = candidates
+			parents[neighbors] = node
+			f = candidates + self._estimate(all_nodes, neighbors, goal_point, estimates)
+			for f_value, neighbor in zip(f.tolist(), neighbors.tolist()):
+				heapq.heappush(open_list, (f_value, neighbor))
+
+		if not np.isfinite(g[goal_node]):
+			return None
+
+		route = [goal_node]
+		while route[-1] != start_node:
+			route.append(parents[route[-1]])
+		route = np.array(route[::-1])
+
+		return ConstrainedPath(all_nodes[route], cost=g[route])
+
+	def _attach(self, endpoint, extra_node):
+		""" Search node, point and linked roadmap nodes of a start or goal """
+		nodes = self._roadmap.nodes
+		if isinstance(endpoint, (int, np.integer)):
+			return int(endpoint), nodes[endpoint], np.zeros(0, dtype=np.intp)
+
+		point = np.asarray(endpoint, dtype=float)
+		if self._domain is None:
+			links = np.array([np.argmin(np.linalg.norm(nodes - point, axis=1))])
+		else:
+			links = np.flatnonzero(self._domain.visible_points(point, nodes))
+
+		return extra_node, point, links
+
+	def _successors(self, all_nodes, node, start_links, goal_node, goal_linked):
+		""" Neighbours of node and the lengths of the edges to them """
+		if node < self._roadmap.num_nodes:
+			neighbors = self._roadmap.neighbors(node)
+			weights = self._roadmap.edge_weights(node)
+		else:
+			neighbors = start_links
+			weights = np.linalg.norm(all_nodes[start_links] - all_nodes[node], axis=1)
+
+		if goal_linked:
+			neighbors = np.append(neighbors, goal_node)
+			weights = np.append(weights, np.linalg.norm(all_nodes[goal_node] - all_nodes[node]))
+
+		return neighbors, weights
+
+	def _estimate(self, all_nodes, indices, goal_point, estimates):
+		""" Estimated cost to goal of nodes, computed once per node as nodes are reached """
+		if self._estimate_heuristic is None:
+			return np.zeros(len(indices))
+
+		unknown = indices[np.isnan(estimates[indices])]
+		if len(unknown) > 0:
+			estimates[unknown] = self._estimate_heuristic.compute_costs(all_nodes[unknown], np.broadcast_to(goal_point, (len(unknown), 2)))
+
+		return estimates[indices]
+
+	@property
+	def roadmap(self):
+		return self._roadmap
+
+def _is_distance(heuristic):
+	""" Whether edge costs under heuristic are Euclidean lengths, None standing for roadmap edge weights """
+	if isinstance(heuristic, CachedHeuristic):
+		heuristic = heuristic.heuristic
+
+	return heuristic is None or isinstance(heuristic, EuclideanDistance)
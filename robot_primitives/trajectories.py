@@ -0,0 +1,173 @@
+import numpy as np
+
+from .paths import ConstrainedPath
+
+# Dormand-Prince 5(4) tableau
+_DOPRI_A = (
+	(),
+	(1/5,),
+	(3/40, 9/40),
+	(44/45, -56/15, 32/9),
+	(19372/6561, -25360/2187, 64448/6561, -212/729),
+	(9017/3168, -355/33, 46732/5247, 49/176, -5103/18656),
+	(35/384, 0., 500/1113, 125/192, -2187/6784, 11/84),
+)
+_DOPRI_B = np.array([35/384, 0., 500/1113, 125/192, -2187/6784, 11/84, 0.])
+_DOPRI_ERROR = _DOPRI_B - np.array([5179/57600, 0., 7571/16695, 393/640, -92097/339200, 187/2100, 1/40])
+
+
+class TrajectoryIntegrator:
+	""" Advances many particles through a VectorField at once, with fixed step
+		 RK4 or adaptive Dormand-Prince RK45. Particles stop when they leave the
+		 bounding region of the field and their trajectories are returned as
+		 ConstrainedPaths with a time constraint
+	"""
+
+	def __init__(self, field, method='rk45', step=0.1, tolerance=1e-6, min_step=1e-6, max_step=None, vehicle_velocity=None, max_iterations=10**6):
+		if method not in ('rk4', 'rk45'):
+			raise ValueError(f"Unknown integration method {method}, supported methods are rk4 and rk45")
+
+		self._field = field
+		self._method = method
+		self._step = step
+		self._tolerance = tolerance
+		self._min_step = min_step
+		self._max_step = max_step
+		self._vehicle_velocity = vehicle_velocity
+		self._max_iterations = max_iterations
+
+	def velocity(self, points):
+		""" Velocity of particles at an (N,2) array of points, the field plus any vehicle velocity """
+		velocity = self._field.sample(points)
+
+		if callable(self._vehicle_velocity):
+			velocity += np.asarray(self._vehicle_velocity(points), dtype=float).reshape(-1, 2)
+		elif self._vehicle_velocity is not None:
+			velocity += np.asarray(self._vehicle_velocity, dtype=float)
+
+		return velocity
+
+	def integrate(self, points, duration):
+		""" Integrate particles starting at an (N,2) array of points for duration seconds,
+			 returns a list of N ConstrainedPaths with a time constraint at every point
+		"""
+		points = np.array(points, dtype=float).reshape(-1, 2)
+		times = np.zeros(len(points))
+		active = self._inside(points)
+
+		record = _TrajectoryRecord(len(points))
+		record.add(np.arange(len(points)), points, times)
+
+		if self._method == 'rk4':
+			self._integrate_rk4(points, times, active, duration, record)
+		else:
+			self._integrate_rk45(points, times, active, duration, record)
+
+		return record.paths()
+
+	def _inside(self, points):
+		boundary = self._field.boundary
+		if boundary is None:
+			return np.ones(len(points), dtype=bool)
+
+		return boundary.contains_points(points)
+
+	def _integrate_rk4(self, points, times, active, duration, record):
+		num_steps = int(np.ceil(duration / self._step - 1e-9))
+		for i in range(min(num_steps, self._max_iterations)):
+			index = np.flatnonzero(active)
+			if len(index) == 0:
+				break
+
+			h = min(self._step, duration - i * self._step)
+			y = points[index]
+			k1 = self.velocity(y)
+			k2 = self.velocity(y + h/2 * k1)
+			k3 = self.velocity(y + h/2 * k2)
+			k4 = self.velocity(y + h * k3)
+
+			self._accept(index, y + h/6 * (k1 + 2*k2 + 2*k3 + k4), times[index] + h, points, times, active, record)
+
+	def _integrate_rk45(self, points, times, active, duration, record):
+		max_step = self._max_step if self._max_step is not None else duration
+		steps = np.full(len(points), min(self._step, max_step))
+		slopes = np.zeros_like(points)
+
+		# First same as last, the final stage of an accepted step is the first stage of the next
+		index = np.flatnonzero(active)
+		slopes[index] = self.velocity(points[index])
+
+		for _ in range(self._max_iterations):
+			index = np.flatnonzero(active & (times < duration))
+			if len(index) == 0:
+				break
+
+			y = points[index]
+			remaining = duration - times[index]
+			h = np.minimum(steps[index], remaining)[:,np.newaxis]
+
+			k = [slopes[index]]
+			for a in _DOPRI_A[1:]:
+				k.append(self.velocity(y + h * sum(coef * k_j for coef, k_j in zip(a, k) if coef != 0.)))
+			k = np.stack(k)
+
+			new_y = y + h * np.tensordot(_DOPRI_B, k, axes=1)
+			error = np.abs(h * np.tensordot(_DOPRI_ERROR, k, axes=1)).max(axis=1)
+
+			# Steps already at the minimum size are accepted regardless of error
+			h = h[:,0]
+			accepted = (error <= self._tolerance) | (h <= self._min_step)
+			with np.errstate(divide='ignore'):
+				factor = np.clip(0.9 * (self._tolerance / error)**0.2, 0.2, 5.)
+			steps[index] = np.clip(h * factor, self._min_step, max_step)
+
+			# Final steps land exactly on duration so particles always finish
+			new_times = np.where(h >= remaining, duration, times[index] + h)
+
+			accepted_index = index[accepted]
+			slopes[accepted_index] = k[-1][accepted]
+			self._accept(accepted_index, new_y[accepted], new_times[accepted], points, times, active, record)
+
+	def _accept(self, index, new_points, new_times, points, times, active, record):
+		# Particles leaving the bounding region stop at their last position inside it
+		inside = self._inside(new_points)
+		active[index[~inside]] = False
+
+		index = index[inside]
+		points[index] = new_points[inside]
+		times[index] = new_times[inside]
+		record.add(index, points[index], times[index])
+
+	@property
+	def field(self):
+		return self._field
+
+	@property
+	def method(self):
+		return self._method
+
+
+class _TrajectoryRecord:
+	""" Accumulates particle states step by step and splits them into paths at the end """
+
+	def __init__(self, num_particles):
+		self._num_particles = num_particles
+		self._ids = []
+		self._points = []
+		self._times = []
+
+	def add(self, ids, points, times):
+		self._ids.append(ids)
+		self._points.append(points.copy())
+		self._times.append(times.copy())
+
+	def paths(self):
+		ids = np.concatenate(self._ids)
+
+		# Stable sort keeps each particle's states in time order
+		order = np.argsort(ids, kind='stable')
+		points = np.concatenate(self._points)[order]
+		times = np.concatenate(self._times)[order]
+		bounds = np.cumsum(np.bincount(ids, minlength=self._num_particles))[:-1]
+
+		return [ConstrainedPath(p, time=t) for p, t in zip(np.split(points, bounds), np.split(times, bounds))]
@@ -14,6 +14,9 @@ setup(
     keywords = "robotics primitives",
     url = "https://github.com/christomaszewski/robot_primitives.git",
     packages=['robot_primitives', 'tests'],
+    python_requires='>=3.10',
+    install_requires=['shapely>=2.1', 'numpy>=1.21'],
+    extras_require={'numexpr': ['numexpr']},
     long_description=read('README.md'),
     classifiers=[
         "Development Status :: 3 - Alpha",
@@ -0,0 +1,157 @@
+import unittest
+import numpy as np
+import shapely
+
+from .context import robot_primitives
+from robot_primitives import areas
+
+class RegionGeometryTest(unittest.TestCase):
+
+	def test_get_side_past_exterior_ring(self):
+		domain = areas.Domain.from_box_corners((0,0), (10,10))
+		domain.add_obstacle(areas.Obstacle(shapely.box(2, 2, 3, 3)))
+
+		self.assertEqual(domain.num_sides, 8)
+		self.assertEqual(domain.get_side(3), [(0.0, 0.0), (10.0, 0.0)])
+		self.assertEqual(domain.get_side(4), [(10.0, 0.0)])
+		self.assertEqual(domain.get_side(7), [])
+		with self.assertRaises(IndexError):
+			domain.get_side(8)
+
+	def test_diameter(self):
+		self.assertAlmostEqual(areas.Domain(shapely.box(0, 0, 3, 4)).diameter, 5.)
+		self.assertAlmostEqual(areas.Domain.from_vertex_list([(0,0), (4,1), (8,0), (4,-1)]).diameter, 8.)
+
+	def test_diameter_of_degenerate_polygons(self):
+		self.assertAlmostEqual(areas.Domain.from_vertex_list([(0,0), (1,1), (2,2)]).diameter, np.sqrt(8.))
+		self.assertEqual(areas.Domain.from_vertex_list([(1,1), (1,1), (1,1)]).diameter, 0.)
+
+	def test_contains_points_matches_contains_point(self):
+		region = areas.Domain.from_vertex_list([(0,0), (10,0), (10,10), (5,3), (0,10)])
+		points = np.random.default_rng(0).uniform(-1., 11., (300, 2))
+
+		expected = [region.contains_point(p) for p in points]
+		np.testing.assert_array_equal(region.contains_points(points), expected)
+		np.testing.assert_array_equal(expected, shapely.intersects_xy(shapely.Polygon(region.vertices), points[:,0], points[:,1]))
+
+	def test_domain_polygon_follows_obstacles(self):
+		domain = areas.Domain.from_box_corners((0,0), (10,10))
+		self.assertEqual(len(domain.polygon.interiors), 0)
+
+		domain.add_obstacle(areas.Obstacle(shapely.box(2, 2, 3, 3)))
+		domain.add_obstacles(areas.Obstacle(shapely.box(6, 6, 8, 8)), areas.Obstacle(shapely.box(6, 2, 7, 3)))
+
+		self.assertEqual(len(domain.polygon.interiors), 3)
+		self.assertAlmostEqual(domain.polygon.area, 100. - 1. - 4. - 1.)
+		self.assertIs(domain.polygon, domain.polygon)
+
+class RoadmapTest(unittest.TestCase):
+
+	def test_from_edges(self):
+		nodes = [(0,0), (3,4), (3,0), (9,9)]
+		roadmap = areas.Roadmap.from_edges(nodes, [(0, 1), (2, 0), (1, 2)])
+
+		self.assertEqual(roadmap.num_nodes, 4)
+		self.assertEqual(roadmap.num_edges, 6)
+		np.testing.assert_array_equal(roadmap.indptr, [0, 2, 4, 6, 6])
+		self.assertEqual(sorted(roadmap.neighbors(0).tolist()), [1, 2])
+		self.assertEqual(len(roadmap.neighbors(3)), 0)
+
+		weights = dict(zip(roadmap.neighbors(1).tolist(), roadmap.edge_weights(1).tolist()))
+		self.assertEqual(weights, {0: 5., 2: 4.})
+
+	def test_directed_edges_with_weights(self):
+		roadmap = areas.Roadmap.from_edges([(0,0), (1,0), (2,0)], [(0, 1), (1, 2)], weights=[2., 7.], symmetric=False)
+
+		np.testing.assert_array_equal(roadmap.neighbors(1), [2])
+		np.testing.assert_array_equal(roadmap.edge_weights(1), [7.])
+		self.assertEqual(len(roadmap.neighbors(2)), 0)
+
+	def test_grid_graph(self):
+		domain = areas.Domain.from_box_corners((0,0), (4,4))
+		domain.add_obstacle(areas.Obstacle(shapely.box(1.5, 1.5, 2.5, 2.5)))
+		graph = domain.grid_graph(1.)
+
+		self.assertTrue(np.all(domain.contains_points(graph.nodes)))
+		self.assertFalse(np.any(np.all(graph.nodes == (2., 2.), axis=1)))
+
+		src = np.repeat(np.arange(graph.num_nodes), np.diff(graph.indptr))
+		pairs = np.stack((graph.nodes[src], graph.nodes[graph.indices]), axis=1)
+		# Edges may run along the boundary, so they are covered rather than contained
+		self.assertTrue(np.all(shapely.covers(domain.polygon, shapely.linestrings(pairs))))
+		np.testing.assert_allclose(graph.weights, np.linalg.norm(pairs[:,1] - pairs[:,0], axis=1))
+
+class DomainRasterTest(unittest.TestCase):
+
+	def setUp(self):
+		self.domain = areas.Domain.from_box_corners((0,0), (20,10))
+		self.domain.add_obstacle(areas.Obstacle(shapely.box(8, 3, 12, 7)))
+		self.raster = self.domain.rasterize(0.25)
+
+	def test_occupancy_and_distance(self):
+		rng = np.random.default_rng(0)
+		points = rng.uniform((0.5, 0.5), (19.5, 9.5), (500, 2))
+		free_space = self.domain.polygon
+		exact = shapely.distance(free_space.boundary, shapely.points(points))
+		exact = np.where(shapely.intersects_xy(free_space, points[:,0], points[:,1]), exact, -exact)
+
+		np.testing.assert_allclose(self.raster.distance(points), exact, atol=0.25)
+		self.assertTrue(np.all(self.raster.clearance(points) <= exact + 1e-6))
+
+		# Cells well clear of the boundary agree with the polygon
+		clear = np.abs(exact) > 0.25
+		np.testing.assert_array_equal(self.raster.occupied(points)[clear], exact[clear] < 0.)
+		self.assertTrue(np.all(self.raster.occupied([(-1., 5.), (25., 5.)])))
+
+	def test_line_of_sight_is_conservative(self):
+		pairs = np.random.default_rng(1).uniform((0, 0), (20, 10), (400, 2, 2))
+		exact = self.domain.line_of_sight_many(pairs)
+		rastered = self.domain.line_of_sight_many(pairs, resolution=0.25)
+
+		self.assertFalse(np.any(rastered & ~exact))
+		self.assertGreater(rastered.sum(), 0.5 * exact.sum())
+
+	def test_raster_is_rebuilt_when_obstacles_change(self):
+		self.assertIs(self.domain.rasterize(0.25), self.raster)
+		self.domain.add_obstacle(areas.Obstacle(shapely.box(2, 2, 4, 4)))
+
+		raster = self.domain.rasterize(0.25)
+		self.assertIsNot(raster, self.raster)
+		self.assertTrue(raster.occupied([(3., 3.)])[0])
+		self.assertFalse(self.raster.occupied([(3., 3.)])[0])
+
+class VisibilityTest(unittest.TestCase):
+
+	def setUp(self):
+		self.domain = areas.Domain.from_box_corners((0,0), (10,10))
+		self.domain.add_obstacle(areas.Obstacle(shapely.box(4, 4, 6, 6)))
+
+	def has_edge(self, graph, p, q):
+		i, j = (int(np.flatnonzero(np.all(graph.nodes == point, axis=1))[0]) for point in (p, q))
+		return j in graph.neighbors(i)
+
+	def test_line_of_sight_many_matches_line_of_sight(self):
+		pairs = np.random.default_rng(0).uniform(-1, 11, size=(200, 2, 2))
+		expected = [self.domain.line_of_sight(p1, p2) for p1, p2 in pairs]
+
+		np.testing.assert_array_equal(self.domain.line_of_sight_many(pairs), expected)
+		self.assertTrue(any(expected) and not all(expected))
+
+	def test_visibility_graph(self):
+		graph = self.domain.visibility_graph()
+
+		# The ingress and egress point is the (0,0) corner, which is not repeated
+		self.assertEqual(graph.num_nodes, 8)
+		self.assertTrue(np.all(graph.weights > 0.))
+		self.assertTrue(self.has_edge(graph, (0,0), (4,4)))
+		self.assertTrue(self.has_edge(graph, (4,4), (6,4)))
+		self.assertFalse(self.has_edge(graph, (0,10), (10,0)))
+		self.assertFalse(self.has_edge(graph, (0,0), (10,10)))
+		self.assertFalse(self.has_edge(graph, (4,4), (6,6)))
+
+		tangent = self.domain.visibility_graph(tangent_only=True)
+		self.assertLessEqual(tangent.num_edges, graph.num_edges)
+		self.assertFalse(self.has_edge(tangent, (0,0), (4,4)))
+
+if __name__ == '__main__':
+	unittest.main()
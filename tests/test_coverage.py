@@ -0,0 +1,75 @@
+import io
+import contextlib
+import unittest
+import numpy as np
+import shapely
+
+from .context import robot_primitives
+from robot_primitives import areas, fields, coverage
+
+class DecomposeTest(unittest.TestCase):
+
+	def test_cells_split_around_obstacle(self):
+		domain = areas.Domain.from_box_corners((0,0), (100,60))
+		domain.add_obstacle(areas.Obstacle(shapely.box(30, 20, 50, 40)))
+
+		segments, cells = coverage.decompose(domain, (1,0), 5.)
+
+		# Below the obstacle, either side of it and above it
+		self.assertEqual(len(np.unique(cells)), 4)
+		np.testing.assert_allclose(segments[:,0,1], segments[:,1,1])
+		self.assertTrue(np.all(segments[:,1,0] > segments[:,0,0]))
+		self.assertEqual(len(segments), 12 + 4)
+		np.testing.assert_allclose(np.diff(np.unique(segments[:,0,1])), 5.)
+
+		# Segments beside the obstacle stop at its sides
+		beside = (segments[:,0,1] > 20.) & (segments[:,0,1] < 40.)
+		self.assertEqual(set(map(tuple, segments[beside][:,:,0].tolist())), {(0., 30.), (50., 100.)})
+		self.assertEqual(len(np.unique(cells[beside])), 2)
+
+	def test_rotated_sweep_covers_domain(self):
+		domain = areas.Domain.from_box_corners((0,0), (100,60))
+		segments, cells = coverage.decompose(domain, (1,1), 5.)
+
+		d = segments[:,1] - segments[:,0]
+		np.testing.assert_allclose(d[:,0], d[:,1], atol=1e-9)
+		self.assertEqual(len(np.unique(cells)), 1)
+
+		# Each line covers a strip spacing wide, which together cover the domain
+		lengths = np.linalg.norm(segments[:,1] - segments[:,0], axis=1)
+		self.assertAlmostEqual(lengths.sum() * 5. / 6000., 1., delta=0.05)
+
+class BoustrophedonPathTest(unittest.TestCase):
+
+	def test_path_stays_in_free_space(self):
+		domain = areas.Domain.from_box_corners((0,0), (100,60))
+		domain.add_obstacle(areas.Obstacle(shapely.Polygon([(30,20), (50,20), (50,40), (30,40)])))
+		domain.add_obstacle(areas.Obstacle(shapely.Polygon([(70,10), (80,10), (75,50)])))
+		# Segment ends are computed in the rotated sweep frame, so allow for rounding
+		free_space = shapely.buffer(coverage._free_space(domain), 1e-9, join_style='mitre')
+
+		for direction in [(1,0), (0,1), (1,1), (1,-2)]:
+			path = coverage.boustrophedon_path(domain, direction, 5.)
+			coords = path.coords
+			segments = shapely.linestrings(np.stack((coords[:-1], coords[1:]), axis=1))
+
+			self.assertTrue(np.all(shapely.covers(free_space, segments)), f'sweep direction {direction}')
+			self.assertEqual(len(path.cell), path.size)
+
+class OptimizeSweepDirectionTest(unittest.TestCase):
+
+	def test_skewed_domain_with_default_heuristic(self):
+		# Passes of every candidate path run along the slanted edges of the domain
+		domain = areas.Domain.from_vertex_list([(0,0), (100,37), (60,90), (-10,40)])
+		with contextlib.redirect_stdout(io.StringIO()):
+			field = fields.BoundedVectorField.channel_flow_model(domain, ((0,0), (100,37)), 0.5)
+
+		result = coverage.optimize_sweep_direction(domain, field, 5., num_angles=6, refinements=1)
+
+		self.assertEqual(len(result.angles), 12)
+		self.assertTrue(np.all(np.isfinite(result.costs)))
+		self.assertEqual(result.cost, result.costs.min())
+		np.testing.assert_allclose(result.direction, (np.cos(result.angle), np.sin(result.angle)))
+
+if __name__ == '__main__':
+	unittest.main()
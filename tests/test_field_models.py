@@ -0,0 +1,34 @@
+import unittest
+import numpy as np
+
+from .context import robot_primitives
+from robot_primitives.field_models import FieldModel, ChannelModel, PolynomialModel
+
+class FieldModelTest(unittest.TestCase):
+
+	def test_from_dict_rejects_import(self):
+		description = {'expression':"__import__('os').getpid() + 0.*x", 'direction':[1., 0.], 'params':{}}
+		with self.assertRaises(ValueError):
+			FieldModel.from_dict(description)
+
+	def test_rejects_attributes_and_unknown_names(self):
+		for expression in ("x.real", "x[0]", "(lambda: 1)() + 0.*x", "open + x", "v + x"):
+			with self.assertRaises(ValueError):
+				FieldModel(expression, (1., 0.))
+
+	def test_builtin_models_round_trip(self):
+		models = [ChannelModel((0., 0.), (0., 1.), 10., 0.5), PolynomialModel((1., 0.), [0.1, 0.2, 0.3])]
+		for model in models:
+			copy = FieldModel.from_dict(model.to_dict())
+			np.testing.assert_allclose(copy.evaluate(np.array([1., 2.]), np.array([3., 4.])), model.evaluate(np.array([1., 2.]), np.array([3., 4.])))
+
+	def test_equal_models_hash_equal(self):
+		model = ChannelModel((0., 0.), (0., 1.), 10., 0.5)
+		same = ChannelModel((0., 0.), (0., 1.), 10., 0.5)
+		other = ChannelModel((0., 0.), (0., 1.), 10., 0.6)
+
+		self.assertEqual(hash(model), hash(same))
+		self.assertEqual(len({model, same, other}), 2)
+
+if __name__ == '__main__':
+	unittest.main()
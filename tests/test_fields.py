@@ -0,0 +1,94 @@
+import unittest
+import numpy as np
+import shapely
+
+from .context import robot_primitives
+from robot_primitives import fields
+from robot_primitives.areas import Domain
+from robot_primitives.fields import VectorField, BoundedVectorField, CompositeVectorField, SumField
+
+class VectorFieldArithmeticTest(unittest.TestCase):
+
+	def setUp(self):
+		self.field = VectorField.from_uniform_vector((1., 2.))
+
+	def test_adding_vector_adds_uniform_field(self):
+		points = np.array([[0., 0.], [3., 4.]])
+		np.testing.assert_allclose((self.field + (0.5, -1.)).sample(points), [[1.5, 1.], [1.5, 1.]])
+		np.testing.assert_allclose(((0.5, -1.) - self.field).sample(points), [[-0.5, -3.], [-0.5, -3.]])
+		np.testing.assert_allclose(sum([self.field, self.field]).sample(points), [[2., 4.], [2., 4.]])
+
+	def test_non_vector_operands_raise_type_error(self):
+		for operand in (1.0, (1., 2., 3.), 'ab', None):
+			with self.assertRaises(TypeError):
+				self.field + operand
+			with self.assertRaises(TypeError):
+				operand + self.field
+			with self.assertRaises(TypeError):
+				self.field - operand
+			with self.assertRaises(TypeError):
+				operand - self.field
+
+	def test_array_operands_defer_to_field(self):
+		points = np.array([[0., 0.]])
+		np.testing.assert_allclose((np.array([0.5, -1.]) + self.field).sample(points), [[1.5, 1.]])
+		np.testing.assert_allclose((np.array([0.5, -1.]) - self.field).sample(points), [[-0.5, -3.]])
+
+		with self.assertRaises(TypeError):
+			np.ones(3) + self.field
+
+class CompositeVectorFieldTest(unittest.TestCase):
+
+	def test_composite_fields_must_define_combine_and_layers(self):
+		with self.assertRaises(TypeError):
+			CompositeVectorField()
+
+		class Incomplete(CompositeVectorField):
+
+			def _combine(self, points):
+				return points
+
+		with self.assertRaises(TypeError):
+			Incomplete()
+
+		self.assertIsInstance(SumField([VectorField.from_uniform_vector((1., 0.))]), CompositeVectorField)
+
+class SumFieldTest(unittest.TestCase):
+
+	def test_bounded_layers_only_see_points_in_their_region(self):
+		seen = []
+		def batch_func(x, y):
+			seen.append(np.column_stack((x, y)))
+			return np.column_stack((np.ones_like(x), np.zeros_like(y)))
+
+		region = Domain.from_box_corners((0,0), (1,1))
+		bounded = BoundedVectorField(lambda x, y: (1., 0.), region, undefined_value=(0., -1.), batch_func=batch_func)
+		field = SumField([bounded, VectorField.from_uniform_vector((0., 2.))])
+
+		points = np.array([[0.5, 0.5], [2., 2.], [0.25, 0.75], [-1., 0.5]])
+		np.testing.assert_allclose(field.sample(points), [[1., 2.], [0., 1.], [1., 2.], [0., 1.]])
+		np.testing.assert_allclose(np.concatenate(seen), [[0.5, 0.5], [0.25, 0.75]])
+
+class CrossSectionTest(unittest.TestCase):
+
+	def test_ray_cross_sections_match_polygon_intersections(self):
+		rng = np.random.default_rng(0)
+		t = np.linspace(-np.pi, np.pi, 400, endpoint=False)
+		r = 50. + 10.*np.sin(7*t) + rng.uniform(-1., 1., len(t))
+		region = Domain.from_vertex_list(np.column_stack((r*np.cos(t), r*np.sin(t))))
+		angles = rng.uniform(-np.pi, np.pi, 1000)
+		directions = np.column_stack((np.cos(angles), np.sin(angles)))
+
+		# Origins inside the region and outside it, where some rays miss
+		for origin in (np.array([3., 1.]), np.array([80., 20.])):
+			rays = shapely.linestrings(np.stack((np.broadcast_to(origin, directions.shape), origin + 200.*directions), axis=1))
+			expected = np.einsum('nij,nj->ni', region.compute_intersections(rays) - origin, directions)
+
+			vertices = region.vertex_array - origin
+			edges = np.stack((vertices, np.roll(vertices, -1, axis=0)), axis=1)
+			radii = fields._ray_cross_sections(edges, region.contains_point(origin), angles)
+
+			np.testing.assert_allclose(radii, expected, atol=1e-9)
+
+if __name__ == '__main__':
+	unittest.main()
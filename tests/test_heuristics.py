@@ -0,0 +1,89 @@
+import io
+import contextlib
+import unittest
+import numpy as np
+
+from .context import robot_primitives
+from robot_primitives import areas, fields, paths
+from robot_primitives import heuristics
+from robot_primitives.heuristics import QuadratureFlowEnergy
+
+class _CountingField:
+	""" Bounded field wrapper counting the points sampled """
+
+	def __init__(self, field):
+		self.field = field
+		self.num_samples = 0
+
+	def sample(self, points):
+		self.num_samples += len(points)
+		return self.field.sample(points)
+
+class QuadratureFlowEnergyTest(unittest.TestCase):
+
+	def test_segment_along_boundary_stays_bounded(self):
+		domain = areas.Domain.from_vertex_list([(0,0), (100,37), (60,90), (-10,40)])
+		with contextlib.redirect_stdout(io.StringIO()):
+			field = fields.BoundedVectorField.channel_flow_model(domain, ((0,0), (100,37)), 0.5)
+		counting_field = _CountingField(field)
+		heuristic = QuadratureFlowEnergy(counting_field, 0.5)
+
+		cost = heuristic.compute_cost((0., 0.), (100., 37.))
+
+		# Relative water speed never exceeds the nominal speed plus the peak flow speed
+		length = np.hypot(100., 37.)
+		self.assertTrue(0. < cost <= length * (0.5 + 0.5) / 0.5)
+		self.assertLessEqual(counting_field.num_samples, 2 * 8 * 1024 * 2)
+
+class VectorizedCostTest(unittest.TestCase):
+
+	def setUp(self):
+		rng = np.random.default_rng(0)
+		self.starts = rng.uniform(0., 10., (40, 2))
+		self.ends = rng.uniform(0., 10., (40, 2))
+
+		# Segments a whole number of steps long, where rounding decides the last step
+		self.ends[:5] = self.starts[:5] + [[0.3, 0.4]]
+		self.field = fields.VectorField.from_channel_flow_model(10., 0.4)
+
+	def assert_batch_matches_loop(self, heuristic, **kwargs):
+		expected = [heuristic.compute_cost(s, e) for s, e in zip(self.starts, self.ends)]
+		np.testing.assert_allclose(heuristic.compute_costs(self.starts, self.ends, **kwargs), expected, rtol=1e-12)
+
+	def test_distances(self):
+		self.assert_batch_matches_loop(heuristics.EuclideanDistance())
+		self.assert_batch_matches_loop(heuristics.DirectedDistance((1., 2.)))
+
+	def test_flow_energies(self):
+		self.assert_batch_matches_loop(heuristics.OpposingFlowEnergy(self.field, 0.5, delta=0.05))
+		self.assert_batch_matches_loop(QuadratureFlowEnergy(self.field, 0.5))
+
+	def test_cached_heuristic(self):
+		cached = heuristics.CachedHeuristic(heuristics.OpposingFlowEnergy(self.field, 0.5, delta=0.05))
+		self.assert_batch_matches_loop(cached)
+		self.assert_batch_matches_loop(cached)
+		self.assertGreater(cached.cache_info().hits, 0)
+
+	def test_quadrature_matches_uniform_flow(self):
+		field = fields.VectorField.from_uniform_vector((0.2, -0.1))
+		heuristic = QuadratureFlowEnergy(field, 0.5)
+
+		directions = (self.ends - self.starts) / np.linalg.norm(self.ends - self.starts, axis=1)[:,np.newaxis]
+		lengths = np.linalg.norm(self.ends - self.starts, axis=1)
+		expected = np.linalg.norm(0.5 * directions - (0.2, -0.1), axis=1) * lengths / 0.5
+		np.testing.assert_allclose(heuristic.compute_costs(self.starts, self.ends), expected)
+
+	def test_cost_matrix_and_path_cost(self):
+		heuristic = heuristics.EuclideanDistance()
+		points = self.starts[:12]
+
+		matrix = heuristics.cost_matrix(heuristic, points, rows_per_chunk=5)
+		expected = np.linalg.norm(points[:,np.newaxis] - points, axis=2)
+		np.testing.assert_allclose(matrix, expected, rtol=1e-6)
+
+		total, segment_costs = heuristics.path_cost(paths.ConstrainedPath(points), heuristic)
+		np.testing.assert_allclose(segment_costs, np.diag(expected, 1))
+		self.assertAlmostEqual(total, np.diag(expected, 1).sum())
+
+if __name__ == '__main__':
+	unittest.main()
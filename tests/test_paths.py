@@ -0,0 +1,108 @@
+import os
+import sys
+import signal
+import tempfile
+import subprocess
+import unittest
+import unittest.mock
+import numpy as np
+import shapely
+
+from .context import robot_primitives
+from robot_primitives import paths
+from robot_primitives.paths import ConstrainedPath
+
+class PathStreamWriterTest(unittest.TestCase):
+
+	def test_partial_chunk_survives_kill_after_fsync_interval(self):
+		with tempfile.TemporaryDirectory() as directory:
+			filename = os.path.join(directory, 'stream.bin')
+
+			# Writer adds points slower than the sync interval and far fewer than a chunk, then is killed
+			script = (
+				"import sys, time\n"
+				f"sys.path.insert(0, {os.path.dirname(os.path.dirname(os.path.abspath(__file__)))!r})\n"
+				"from robot_primitives.paths import PathStreamWriter\n"
+				f"writer = PathStreamWriter({filename!r}, chunk_size=256, fsync_interval=0.2)\n"
+				"for i in range(3):\n"
+				"\twriter.add_point((float(i), 2.*i), time=float(i))\n"
+				"\ttime.sleep(0.3)\n"
+				"print('ready', flush=True)\n"
+				"time.sleep(60)\n"
+			)
+			writer = subprocess.Popen([sys.executable, '-c', script], stdout=subprocess.PIPE, text=True)
+			try:
+				self.assertEqual(writer.stdout.readline().strip(), 'ready')
+			finally:
+				writer.send_signal(signal.SIGKILL)
+				writer.wait()
+				writer.stdout.close()
+
+			path = ConstrainedPath.from_stream(filename)
+
+		# The first two points were synced when the interval elapsed before the next was added
+		self.assertGreaterEqual(path.size, 2)
+		np.testing.assert_array_equal(path.coords[:2], [(0., 0.), (1., 2.)])
+		np.testing.assert_array_equal(path.constraints['time'][:2], [0., 1.])
+
+class PathBinaryFormatTest(unittest.TestCase):
+
+	def test_save_over_the_file_a_path_was_loaded_from(self):
+		coords = np.column_stack((np.arange(10000.), np.sin(np.arange(10000.))))
+		with tempfile.TemporaryDirectory() as directory:
+			filename = os.path.join(directory, 'path.rpath')
+			ConstrainedPath(coords, speed=np.arange(10000.)).save(filename)
+
+			path = ConstrainedPath.from_file(filename)
+			path.save(filename)
+			reloaded = ConstrainedPath.from_file(filename)
+
+			np.testing.assert_array_equal(reloaded.coords, coords)
+			np.testing.assert_array_equal(reloaded.constraints['speed'], np.arange(10000.))
+			self.assertEqual(os.listdir(directory), ['path.rpath'])
+
+	def test_object_constraints_must_be_json_native(self):
+		with tempfile.TemporaryDirectory() as directory:
+			filename = os.path.join(directory, 'path.rpath')
+
+			labels = ['start', None, {'cell':[1, 2]}]
+			ConstrainedPath([(0., 0.), (1., 0.), (2., 0.)], label=labels).save(filename)
+			self.assertEqual(ConstrainedPath.from_file(filename).constraints['label'].tolist(), labels)
+
+			with self.assertRaises(ValueError):
+				ConstrainedPath([(0., 0.), (1., 0.)], waypoint=[(0, 0), (1, 0)]).save(filename)
+
+class SimplifyTest(unittest.TestCase):
+
+	def test_douglas_peucker_matches_shapely_on_millions_of_points(self):
+		rng = np.random.default_rng(0)
+		coords = np.cumsum(rng.normal(size=(2000000, 2)), axis=0)
+		path = ConstrainedPath(coords, index=np.arange(len(coords)))
+
+		simplified = path.simplify(0.5)
+
+		expected = shapely.get_coordinates(shapely.simplify(shapely.linestrings(coords), 0.5, preserve_topology=False))
+		self.assertEqual(simplified.size, len(expected))
+		np.testing.assert_array_equal(simplified.coords, expected)
+		np.testing.assert_array_equal(coords[simplified.constraints['index']], expected)
+
+	def test_douglas_peucker_collinear_points(self):
+		coords = np.column_stack((np.arange(200000.), 0.5 * np.arange(200000.)))
+		simplified = ConstrainedPath(coords, index=np.arange(len(coords))).simplify(1e-6)
+
+		np.testing.assert_array_equal(simplified.coords, coords[[0, -1]])
+		np.testing.assert_array_equal(simplified.constraints['index'], [0, len(coords) - 1])
+
+	def test_visvalingam_thins_collinear_points_in_few_rounds(self):
+		coords = np.column_stack((np.arange(200000.), 0.5 * np.arange(200000.)))
+		path = ConstrainedPath(coords)
+
+		# Every round recomputes triangle areas once, ties must not leave one removal per round
+		with unittest.mock.patch.object(paths, '_triangle_areas', wraps=paths._triangle_areas) as triangle_areas:
+			simplified = path.simplify(1e-6, method='visvalingam')
+
+		np.testing.assert_array_equal(simplified.coords, coords[[0, -1]])
+		self.assertLess(triangle_areas.call_count, 64)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import numpy as np
+import shapely
+
+from .context import robot_primitives
+from robot_primitives import areas, heuristics
+from robot_primitives.base import Heuristic
+from robot_primitives.planners import GraphPlanner
+
+class _TailwindCost(Heuristic):
+	""" Edge costs a tenth of their length where they run mostly above y = 1, as with a
+		 strong following current there, so costs fall below the distance travelled
+	"""
+
+	def compute_cost(self, start_point, end_point):
+		return self.compute_costs([start_point], [end_point])[0]
+
+	def compute_costs(self, start_points, end_points):
+		starts = np.asarray(start_points, dtype=float).reshape(-1, 2)
+		ends = np.asarray(end_points, dtype=float).reshape(-1, 2)
+		lengths = np.linalg.norm(ends - starts, axis=1)
+
+		return np.where((starts[:,1] + ends[:,1]) / 2. > 1., 0.1, 1.) * lengths
+
+class GraphPlannerTest(unittest.TestCase):
+
+	def test_plan_around_obstacle(self):
+		domain = areas.Domain.from_box_corners((0,0), (10,10))
+		domain.add_obstacle(areas.Obstacle(shapely.box(4, 3, 6, 6)))
+		planner = GraphPlanner.from_domain(domain)
+
+		path = planner.plan((1., 5.), (9., 5.))
+
+		np.testing.assert_allclose(path.coords[[0, -1]], [[1., 5.], [9., 5.]])
+		self.assertAlmostEqual(path.cost[-1], 2*np.sqrt(10.) + 2.)
+		for p1, p2 in zip(path.coords[:-1], path.coords[1:]):
+			self.assertTrue(domain.visible_points(p1, [p2])[0])
+
+	def test_unreachable_goal(self):
+		roadmap = areas.Roadmap.from_edges([(0,0), (1,0), (5,5)], [(0, 1)])
+
+		self.assertIsNone(GraphPlanner(roadmap).plan(0, 2))
+
+	def test_default_estimate_is_admissible_for_non_distance_costs(self):
+		# The cheap route detours away from the goal, so a Euclidean estimate would
+		# settle for the direct edge first
+		roadmap = areas.Roadmap.from_edges([(0,0), (10,0), (-5,5)], [(0, 1), (0, 2), (2, 1)])
+		cost = _TailwindCost()
+
+		dijkstra = GraphPlanner(roadmap, cost, estimate_heuristic=None).plan(0, 1)
+		planned = GraphPlanner(roadmap, cost).plan(0, 1)
+		euclidean = GraphPlanner(roadmap, cost, estimate_heuristic=heuristics.EuclideanDistance()).plan(0, 1)
+
+		self.assertAlmostEqual(planned.cost[-1], dijkstra.cost[-1])
+		self.assertAlmostEqual(planned.cost[-1], 0.1 * (np.sqrt(50.) + np.sqrt(250.)))
+		self.assertGreater(euclidean.cost[-1], planned.cost[-1])
+
+	def test_default_estimate_for_distance_costs(self):
+		roadmap = areas.Roadmap.from_edges([(0,0), (10,0), (-5,5)], [(0, 1), (0, 2), (2, 1)])
+
+		self.assertIsInstance(GraphPlanner(roadmap)._estimate_heuristic, heuristics.EuclideanDistance)
+		self.assertIsInstance(GraphPlanner(roadmap, heuristics.CachedHeuristic(heuristics.EuclideanDistance()))._estimate_heuristic,
+			heuristics.EuclideanDistance)
+		self.assertIsNone(GraphPlanner(roadmap, _TailwindCost())._estimate_heuristic)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+import numpy as np
+
+from .context import robot_primitives
+from robot_primitives import areas
+from robot_primitives.fields import VectorField, BoundedVectorField
+from robot_primitives.trajectories import TrajectoryIntegrator
+
+def _vortex(x, y):
+	return np.column_stack((-np.asarray(y), np.asarray(x)))
+
+class TrajectoryIntegratorTest(unittest.TestCase):
+
+	def test_uniform_flow(self):
+		field = VectorField.from_uniform_vector((1., 0.5))
+		starts = np.array([[0., 0.], [2., -1.]])
+
+		for method in ('rk4', 'rk45'):
+			paths = TrajectoryIntegrator(field, method=method, step=0.3).integrate(starts, 2.)
+
+			self.assertEqual(len(paths), 2)
+			for start, path in zip(starts, paths):
+				self.assertAlmostEqual(path.time[-1], 2.)
+				np.testing.assert_allclose(path.coords[-1], start + (2., 1.), atol=1e-12)
+				np.testing.assert_allclose(path.coords, start + path.time[:,np.newaxis] * (1., 0.5), atol=1e-12)
+
+	def test_vortex_returns_to_start(self):
+		field = VectorField(lambda x, y: tuple(_vortex(x, y)[0]), batch_func=_vortex)
+		starts = np.array([[1., 0.], [0., 2.], [-0.5, -0.5]])
+
+		rk45 = TrajectoryIntegrator(field, tolerance=1e-9).integrate(starts, 2*np.pi)
+		rk4 = TrajectoryIntegrator(field, method='rk4', step=0.01).integrate(starts, 2*np.pi)
+
+		for start, a, b in zip(starts, rk45, rk4):
+			np.testing.assert_allclose(a.coords[-1], start, atol=1e-6)
+			np.testing.assert_allclose(b.coords[-1], start, atol=1e-6)
+			np.testing.assert_allclose(np.linalg.norm(a.coords, axis=1), np.linalg.norm(start), rtol=1e-6)
+
+	def test_particles_stop_at_region_boundary(self):
+		region = areas.Domain.from_box_corners((0,0), (10,10))
+		field = BoundedVectorField.from_model(VectorField.from_uniform_vector((1., 0.)).model, region)
+		starts = np.array([[1., 5.], [8., 5.], [-1., 5.]])
+
+		paths = TrajectoryIntegrator(field, method='rk4', step=0.5).integrate(starts, 5.)
+
+		self.assertAlmostEqual(paths[0].time[-1], 5.)
+		np.testing.assert_allclose(paths[0].coords[-1], (6., 5.))
+		self.assertLess(paths[1].time[-1], 5.)
+		self.assertTrue(np.all(region.contains_points(paths[1].coords)))
+		np.testing.assert_allclose(paths[1].coords[-1], (10., 5.))
+		self.assertEqual(paths[2].size, 1)
+
+	def test_unknown_method(self):
+		with self.assertRaises(ValueError):
+			TrajectoryIntegrator(VectorField.from_uniform_vector((1., 0.)), method='euler')
+
+if __name__ == '__main__':
+	unittest.main()